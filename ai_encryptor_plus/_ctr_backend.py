@@ -0,0 +1,26 @@
+# ai_encryptor_plus/_ctr_backend.py
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# --- BACKEND SELECTION ---
+# PyCryptodome's CTR generates the keystream many blocks at a time (AES-NI wide
+# pipeline). If it is not installed we fall back to `cryptography`.
+try:
+    from Crypto.Cipher import AES as _AES
+    BACKEND = "pycryptodome"
+except ImportError:
+    _AES = None
+    BACKEND = "cryptography"
+
+def ctr_stream(key: bytes, nonce16: bytes):
+    """
+    Return an update(data) -> bytes callable over ONE continuous CTR keystream.
+    The full 16-byte nonce is the initial 128-bit counter block, exactly like
+    cryptography's modes.CTR, so both backends produce identical bytes.
+    """
+    if _AES is not None:
+        return _AES.new(key, _AES.MODE_CTR, nonce=b"", initial_value=nonce16).encrypt
+    return Cipher(algorithms.AES(key), modes.CTR(nonce16)).encryptor().update
+
+def aes_ctr(key: bytes, nonce16: bytes, data: bytes) -> bytes:
+    # One-shot CTR (encrypt and decrypt are the same operation)
+    return ctr_stream(key, nonce16)(data)
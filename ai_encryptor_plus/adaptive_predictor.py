@@ -1,5 +1,9 @@
+import threading
 import psutil
-from collections import defaultdict
+import numpy as np
+
+# Rate table ke slots; aakhri slot un sab suffixes ke liye jo table full hone ke baad aaye
+MAX_SUFFIX_SLOTS = 256
 
 class AdaptivePredictor:
     """
@@ -12,8 +16,11 @@ class AdaptivePredictor:
         self.alpha = alpha
         # Dynamic initial rate based on system resources
         self.rate_bps = self._estimate_initial_rate()
-        # Har file type ke liye alag rate store karte hain
-        self.type_rate = defaultdict(lambda: self.rate_bps)
+        # Har file type ke liye alag rate: NumPy table + suffix -> slot index map
+        self._rate = np.full(MAX_SUFFIX_SLOTS, self.rate_bps, dtype=np.float64)
+        self._idx = {}
+        # GLOBAL_SCHEDULER request threads ke beech shared hai - naye slot ka assignment lock me
+        self._idx_lock = threading.Lock()
 
     def _estimate_initial_rate(self) -> float:
         """
@@ -34,14 +41,35 @@ class AdaptivePredictor:
             # Conservative default if system info unavailable
             return 10 * 1024 * 1024
 
+    def suffix_index(self, suffix: str) -> int:
+        """
+        Slot of this suffix in the rate table (new suffixes get the next free slot).
+        """
+        i = self._idx.get(suffix)
+        if i is None:
+            with self._idx_lock:
+                # Double check: doosre thread ne shayad abhi yahi suffix add kiya ho
+                i = self._idx.get(suffix)
+                if i is None:
+                    if len(self._idx) >= MAX_SUFFIX_SLOTS - 1:
+                        return MAX_SUFFIX_SLOTS - 1
+                    i = self._idx[suffix] = len(self._idx)
+        return i
+
+    def predict_batch(self, sizes, idx) -> np.ndarray:
+        """
+        Vectorized predict: seconds for every (size, slot index) pair in one op.
+        """
+        return np.asarray(sizes, dtype=np.float64) / np.maximum(1.0, self._rate[idx])
+
     def predict(self, chunk_size: int, suffix: str, sample=None) -> float:
         """
         Predict encryption time based purely on current throughput estimate.
         """
         # File type ke aadhaar par current rate nikalo
-        rate = self.type_rate[suffix]
+        rate = self._rate[self.suffix_index(suffix)]
         # Time = size / speed se calculate karo
-        return chunk_size / max(1.0, rate)
+        return chunk_size / max(1.0, float(rate))
 
     def observe(self, chunk_size: int, suffix: str, actual_s: float, sample=None):
         """
@@ -50,6 +78,7 @@ class AdaptivePredictor:
         # Actual rate = bytes / seconds
         observed_rate = chunk_size / max(1e-6, actual_s)
         # Purana rate nikalo
-        current_rate = self.type_rate[suffix]
+        i = self.suffix_index(suffix)
+        current_rate = self._rate[i]
         # Exponential smoothing se naya rate calculate karo: 75% purana + 25% naya
-        self.type_rate[suffix] = (1 - self.alpha) * current_rate + self.alpha * observed_rate
+        self._rate[i] = (1 - self.alpha) * current_rate + self.alpha * observed_rate
@@ -1,8 +1,15 @@
 # ai_encryptor_plus/autotuner.py
-import os, time, hashlib
+import os, time
 from typing import Tuple, List
 import multiprocessing
 import concurrent.futures
+from ._ctr_backend import aes_ctr
+
+# Throwaway key/nonce - only used to benchmark, never to protect data
+_TUNE_KEY = bytes(32)
+_TUNE_NONCE = bytes(16)
+# Benchmark buffer size (MB): 2x the largest chunk candidate
+TUNE_SAMPLE_MB = 4
 
 def cpu_count():
     try:
@@ -13,58 +20,85 @@ def cpu_count():
 # --- OS REQUIREMENT: Top-level function for Pickling ---
 # Local functions inside _trial() cannot be pickled on Windows when using Processes.
 def _worker_task(data_chunk: bytes) -> bool:
-    # Simulate CPU-heavy work (SHA256 is a good proxy for AES)
-    hashlib.sha256(data_chunk).digest()
+    # Run the real hot path (AES-CTR on the deployed backend), not a proxy
+    aes_ctr(_TUNE_KEY, _TUNE_NONCE, data_chunk)
     return True
 
-def _trial(chunk_size: int, workers: int, sample_mb: int = 16) -> float:
-    # Create random data buffer
+def _trial(chunk_size: int, workers: int, ex, data: bytes) -> float:
+    # ex = ONE pool shared by all trials (sized for the largest worker count);
+    # at most `workers` jobs are in flight, which caps the parallelism.
     # Note: For the benchmark, we still pass data via IPC (Pickle) rather than mmap.
     # This actually helps penalize "Too Many Workers" correctly, because 
     # it simulates the overhead of coordinating many heavy processes.
-    data = os.urandom(sample_mb * 1024 * 1024)
-    
-    # Slicing
     parts = [data[i:i+chunk_size] for i in range(0, len(data), chunk_size)]
-    
-    t0 = time.time()
-    
-    # --- OS CHANGE: Use ProcessPoolExecutor ---
-    # This measures the cost of spawning processes + context switching.
-    # If 16 workers take too long to start, this benchmark will now catch it!
-    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
-        # We use list() to force execution and wait for all results
-        list(ex.map(_worker_task, parts))
+    # Small sample = few chunks: repeat them so every worker gets ~2 jobs
+    jobs = parts * max(1, -(-2 * workers // len(parts)))
+
+    t0 = time.perf_counter_ns()
+    inflight = set()
+    for part in jobs:
+        if len(inflight) >= workers:
+            done, inflight = concurrent.futures.wait(inflight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for f in done: f.result()
+        inflight.add(ex.submit(_worker_task, part))
+    for f in inflight: f.result()
+    t1 = time.perf_counter_ns()
         
-    t1 = time.time()
-    elapsed = t1 - t0
+    elapsed = (t1 - t0) / 1e9
     
     # Return MB/s
-    throughput = len(data) / (1024*1024) / max(1e-6, elapsed)
+    throughput = len(jobs) * chunk_size / (1024*1024) / max(1e-6, elapsed)
     return throughput
 
-def tune_short(trial_seconds: int = 3, candidate_chunks: List[int] = None) -> dict:
+def _sweep(configs, ex, data: bytes, results: dict) -> None:
+    # Run trials in order; stop early once throughput falls >10% below the best twice
+    best, drops = 0.0, 0
+    for c, w in configs:
+        if (c, w) in results: continue
+        try:
+            perf = _trial(c, w, ex, data)
+        except Exception:
+            perf = 0.0
+        results[(c, w)] = perf
+        if perf > best:
+            best, drops = perf, 0
+        elif perf < best * 0.9:
+            drops += 1
+            if drops >= 2: break
+
+def tune_short(trial_seconds: int = 3, candidate_chunks: List[int] = None, max_workers: int = None) -> dict:
     # Benchmarking different configurations
     if candidate_chunks is None:
-        candidate_chunks = [1*1024*1024, 4*1024*1024, 8*1024*1024, 16*1024*1024]
+        # Whole MiB only - settings/UI report chunk size in integer MB (512K showed as 0).
+        # Largest candidate is half the sample so every trial has several chunks.
+        candidate_chunks = [1*1024*1024, 2*1024*1024]
     
     cpus = cpu_count()
-    # We test: 1 worker, Half Cores, All Cores, and 1.5x Cores (to see if oversubscribing helps)
+    if max_workers: cpus = min(cpus, max_workers)
+    # Worker axis: 1 worker, Half Cores, All Cores, and 1.5x Cores (to see if oversubscribing helps)
     candidate_workers = sorted(list(set([1, max(1, cpus//2), cpus, int(cpus * 1.5)])))
+    # Never benchmark past the caller's ceiling
+    if max_workers: candidate_workers = [w for w in candidate_workers if w <= max_workers]
     
     results = {}
-    print(f"  [AutoTuner] Benchmarking {len(candidate_chunks)} chunk sizes across {candidate_workers} worker counts...")
+    data = os.urandom(TUNE_SAMPLE_MB * 1024 * 1024)
+    print(f"  [AutoTuner] Coordinate search: {len(candidate_chunks)} chunk sizes, then {candidate_workers} worker counts...")
     
-    for c in candidate_chunks:
-        for w in candidate_workers:
-            try:
-                perf = _trial(c, w)
-                results[(c, w)] = perf
-                # Optional: Debug print to see scores real-time
-                # print(f"    Chunk {c//1024//1024}MB | Workers {w} -> {perf:.2f} MB/s")
-            except Exception as e:
-                # print(f"    Failed {c}, {w}: {e}")
-                results[(c, w)] = 0.0
+    # --- OS CHANGE: ONE ProcessPoolExecutor for every trial ---
+    # 'spawn': the tuner runs on a background thread of a multi-threaded server,
+    # and fork() from there can clone locks held by other threads.
+    pool_size = max(candidate_workers)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context("spawn")) as ex:
+        # Bring every worker up BEFORE any clock starts - interpreter start-up
+        # is a one-off cost for the long-lived app pool, not throughput
+        for f in [ex.submit(os.getpid) for _ in range(pool_size)]: f.result()
+
+        # 1. Fix workers = all cores, sweep chunk sizes
+        _sweep([(c, cpus) for c in candidate_chunks], ex, data, results)
+
+        # 2. Fix the best chunk size, sweep worker counts (~6 trials in total)
+        top = max(candidate_chunks, key=lambda c: results.get((c, cpus), 0.0))
+        _sweep([(top, w) for w in candidate_workers], ex, data, results)
                 
     # Pick the winner
     best = max(results.items(), key=lambda kv: kv[1])
@@ -1,8 +1,8 @@
-import os, secrets, json, math, hashlib, mmap, gc
+import os, secrets, json, math, hashlib, hmac, mmap, gc, struct, multiprocessing
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Tuple
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from ._ctr_backend import aes_ctr
 from .key_vault import store_key, load_key
 
 # --- HELPER: HEADER CONSTANTS ---
@@ -10,6 +10,12 @@ HEADER_MAGIC = b"CTRCH"
 HEADER_SIZE = 5 + 16 + 8 # Magic(5) + Nonce(16) + ChunkSize(8) = 29 bytes
 LEN_PREFIX_SIZE = 8 # 8 bytes for length prefix per chunk
 
+# --- HELPER: MAC SIDECAR CONSTANTS (<file>.enc.meta.bin) ---
+MACS_MAGIC = b"CTRMC"
+MACS_HEADER_SIZE = 5 + 8 + 8 # Magic(5) + ChunkSize(8) + ChunkCount(8) = 21 bytes
+MAC_SIZE = 32 # Raw HMAC-SHA256 digest per chunk
+OFFSET_ENTRY_SIZE = 8 + 8 # Optional table after the MACs: (Offset u64, Length u64) per chunk
+
 def _derive_base_nonce() -> bytes:
     return secrets.token_bytes(8) + secrets.token_bytes(8)
 
@@ -21,28 +27,93 @@ def _chunk_nonce(base_nonce: bytes, idx: int) -> bytes:
 def _derive_auth_key(aes_key: bytes) -> bytes:
     return hashlib.sha256(aes_key + b"auth_key").digest()
 
-# --- WORKER (MMAP ZERO-COPY) ---
+def _write_at(path: str, pos: int, bufs) -> None:
+    # Gather-write: length prefix + data in ONE pwritev() syscall, straight from
+    # our buffers (no copy into a Python file buffer). Seek + write elsewhere.
+    fd = os.open(path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    try:
+        if hasattr(os, "pwritev"):
+            done = os.pwritev(fd, bufs, pos)
+            if done == sum(len(b) for b in bufs): return
+            # Short write (rare on regular files) - finish the rest below
+            bufs = [memoryview(b"".join(bufs))[done:]]
+            pos += done
+        os.lseek(fd, pos, os.SEEK_SET)
+        for b in bufs:
+            mv = memoryview(b)
+            while mv:
+                mv = mv[os.write(fd, mv):]
+    finally:
+        os.close(fd)
+
+def _preallocate(f, size: int) -> None:
+    # Reserve every extent up front: fewer metadata updates while workers write,
+    # and the filesystem can lay the file out contiguously. Plain truncate otherwise.
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass # e.g. filesystem without fallocate support
+    f.truncate(size)
+
+def _write_mac_sidecar(path: Path, chunk_size: int, macs, offsets=None) -> None:
+    # Compact binary manifest: header + 32 raw bytes per chunk (no hex, no JSON)
+    # + (offset, length) of every chunk, so decrypt never has to scan the file
+    with open(path, "wb") as f:
+        f.write(MACS_MAGIC + chunk_size.to_bytes(8, "big") + len(macs).to_bytes(8, "big"))
+        f.write(b"".join(macs))
+        if offsets:
+            f.write(struct.pack(f">{2 * len(offsets)}Q", *(v for pair in offsets for v in pair)))
+
+def _read_mac_sidecar(path: Path, chunk_size: int, chunk_count: int):
+    """Returns (macs_blob, offsets or None). Older sidecars have no offset table."""
+    blob = Path(path).read_bytes()
+    if blob[:5] != MACS_MAGIC: raise ValueError("Invalid MAC sidecar")
+    if int.from_bytes(blob[5:13], "big") != chunk_size or int.from_bytes(blob[13:21], "big") != chunk_count:
+        raise ValueError("MAC sidecar does not match manifest")
+    macs_end = MACS_HEADER_SIZE + chunk_count * MAC_SIZE
+    if len(blob) < macs_end: raise ValueError("Truncated MAC sidecar")
+    macs = blob[MACS_HEADER_SIZE:macs_end]
+    if len(blob) == macs_end:
+        return macs, None
+    if len(blob) != macs_end + chunk_count * OFFSET_ENTRY_SIZE:
+        raise ValueError("Truncated offset table")
+    flat = struct.unpack_from(f">{2 * chunk_count}Q", blob, macs_end)
+    return macs, list(zip(flat[0::2], flat[1::2]))
+
+# --- WORKER (MMAP ZERO-COPY IN, DIRECT WRITE OUT) ---
 def _worker_encrypt_chunk_mmap(args) -> Tuple[int, bytes]:
-    key, base_nonce, idx, src_path, offset, length = args
+    key, auth_key, base_nonce, idx, src_path, dst_path, offset, length, write_pos = args
     nonce = _chunk_nonce(base_nonce, idx)
     
-    with open(src_path, "r+b") as f:
+    with open(src_path, "rb") as f:
         # Direct OS Map - Zero User Buffer Copy
         with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
             chunk_data = mm[offset : offset + length]
-            cipher = Cipher(algorithms.AES(key), modes.CTR(nonce))
-            op = cipher.encryptor()
-            # Encrypt
-            ct = op.update(chunk_data) + op.finalize()
+            # Encrypt (wide AES-NI backend when available)
+            ct = aes_ctr(key, nonce, chunk_data)
             
-    return idx, ct
+    # Fused HMAC: ciphertext abhi L2 cache mein hai, dobara memory se mat padho
+    # hmac.digest() with a named digest runs entirely inside OpenSSL (SHA-NI when present)
+    mac = hmac.digest(auth_key, ct, "sha256")
+
+    # Ciphertext goes straight into its grid slot in the pre-sized output file.
+    # Only (idx, mac) travels back over IPC - no multi-MB pickle per chunk.
+    _write_at(dst_path, write_pos, [len(ct).to_bytes(8, "big"), ct])
+    return idx, mac
 
 def _worker_decrypt_chunk(args) -> Tuple[int, bytes]:
-    key, base_nonce, idx, ct = args
+    key, auth_key, base_nonce, idx, enc_path, offset, length, expected_mac = args
     nonce = _chunk_nonce(base_nonce, idx)
-    cipher = Cipher(algorithms.AES(key), modes.CTR(nonce))
-    dec = cipher.decryptor()
-    pt = dec.update(ct) + dec.finalize()
+    with open(enc_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ct = mm[offset : offset + length]
+    # Verify-then-decrypt in the same worker: HMAC runs in parallel and the
+    # ciphertext is read once, still hot in cache for the AES pass.
+    if not hmac.compare_digest(hmac.digest(auth_key, ct, "sha256"), expected_mac):
+        raise ValueError(f"HMAC mismatch on chunk {idx}")
+    pt = aes_ctr(key, nonce, ct)
     return idx, pt
 
 # --- MAIN ENGINE (SCATTER-WRITE OPTIMIZED) ---
@@ -60,215 +131,215 @@ def encrypt_file_chunked(src: Path, dst: Path, key: bytes, key_id: str,
     dst = Path(dst)
     tmp = dst.with_suffix(dst.suffix + ".tmp")
     manifest = dst.with_suffix(dst.suffix + ".meta.json")
+    macs_path = dst.with_suffix(dst.suffix + ".meta.bin")
     
     filesize = src.stat().st_size
     chunk_count = math.ceil(filesize / chunk_size) if chunk_size > 0 else 1
     base_nonce = _derive_base_nonce()
     auth_key = _derive_auth_key(key)
 
-    # 2. Prepare Tasks (Coordinates)
-    args_list = []
-    for idx in range(chunk_count):
-        offset = idx * chunk_size
-        length = min(chunk_size, filesize - offset)
-        args_list.append((key, base_nonce, idx, str(src), offset, length))
+    # 2. Prepare Tasks (Coordinates) - lazily, one tuple per submitted chunk
+    # DISK OFFSET of every chunk: Pos = Header + (Index * (LenPrefix + ChunkSize)).
+    # Only the *last* chunk can be shorter, so this works for every chunk start.
+    def _tasks():
+        for idx in range(chunk_count):
+            offset = idx * chunk_size
+            length = min(chunk_size, filesize - offset)
+            write_pos = HEADER_SIZE + (idx * (LEN_PREFIX_SIZE + chunk_size))
+            yield (key, auth_key, base_nonce, idx, str(src), str(tmp), offset, length, write_pos)
+
+    # 3. Header + Pre-allocate
+    # Workers open the tmp file themselves, so it must exist at its final size
+    # before the first chunk is submitted.
+    # Total = Header + (Count * LenPrefix) + FileSize (CiphertextLen == PlaintextLen for CTR)
+    with open(tmp, "wb", buffering=0) as out:
+        out.write(HEADER_MAGIC + base_nonce + chunk_size.to_bytes(8, "big"))
+        _preallocate(out, HEADER_SIZE + (chunk_count * LEN_PREFIX_SIZE) + filesize)
 
-    # 3. Submit to Pool
+    # 4. Pick the Pool
     if executor and use_processes:
-        futures = {executor.submit(_worker_encrypt_chunk_mmap, a): i for i, a in enumerate(args_list)}
+        pool = executor
     elif use_processes:
         # Fallback pool (only if global is missing)
         pool = ProcessPoolExecutor(max_workers=workers)
-        futures = {pool.submit(_worker_encrypt_chunk_mmap, a): i for i, a in enumerate(args_list)}
     else:
         # Thread fallback (rare)
-        from concurrent.futures import ThreadPoolExecutor
         pool = ThreadPoolExecutor(max_workers=workers)
-        futures = {pool.submit(_worker_encrypt_chunk_mmap, a): i for i, a in enumerate(args_list)}
 
-    # 4. ASYNC SCATTER-WRITE (The Speedup)
-    # Instead of waiting for all, we write to disk AS SOON as a chunk finishes.
-    # We use file.seek() to place the data in the exact correct spot.
+    # 5. ASYNC SCATTER-WRITE (The Speedup)
+    # Every worker writes its own chunk to the exact correct spot as soon as it
+    # is encrypted; the driver only collects the MACs.
     
     # Disable GC to prevent micro-stutters during high-speed IO
     gc.disable()
     
     try:
-        with open(tmp, "wb") as out:
-            # A. Write Header immediately
-            out.write(HEADER_MAGIC)
-            out.write(base_nonce)
-            out.write(chunk_size.to_bytes(8, "big"))
-            
-            # B. Pre-allocate file size (Optional, prevents fragmentation)
-            # Total = Header + (Count * LenPrefix) + FileSize
-            # (Approximate, assumes CiphertextLen == PlaintextLen which is true for CTR)
-            # out.seek(HEADER_SIZE + (chunk_count * LEN_PREFIX_SIZE) + filesize - 1)
-            # out.write(b'\0')
-            
-            chunk_hmacs = [None] * chunk_count
+        chunk_hmacs = [None] * chunk_count
 
-            # C. Process Results Out-of-Order
-            for fut in as_completed(futures):
-                idx, ct = fut.result()
-                
-                # Calculate HMAC while data is hot in cache
-                mac = hmac.new(auth_key, ct, hashlib.sha256).hexdigest()
-                chunk_hmacs[idx] = mac
+        # Bounded in-flight window (streaming)
+        # Only 2x workers chunks are submitted at a time, so at most that many
+        # chunk buffers are alive - peak memory no longer grows with file size.
+        tasks = _tasks()
+        max_inflight = 2 * max(1, workers)
+        inflight = set()
+        while True:
+            while len(inflight) < max_inflight:
+                a = next(tasks, None)
+                if a is None: break
+                inflight.add(pool.submit(_worker_encrypt_chunk_mmap, a))
+            if not inflight: break
+            done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
 
-                # CALCULATE DISK OFFSET
-                # Where does this chunk belong?
-                # Pos = Header + (Index * (LenPrefix + ChunkSize))
-                # Note: This math works because all chunks (except last) are fixed size.
-                # For the last chunk, it naturally falls at the end, but since we might 
-                # write the last chunk *before* the first one finishes, we need exact math.
-                
-                # Wait! If last chunk is smaller, simple multiplication fails for indexes AFTER it?
-                # Actually, only the *last* chunk varies. So standard multiplication works 
-                # for every chunk start position.
-                
-                write_pos = HEADER_SIZE + (idx * (LEN_PREFIX_SIZE + chunk_size))
-                
-                # Write Length + Data
-                out.seek(write_pos)
-                out.write(len(ct).to_bytes(8, "big"))
-                out.write(ct)
-                
-                # Release memory immediately
-                del ct
+            # Process Results Out-of-Order
+            for fut in done:
+                idx, mac = fut.result()
+                chunk_hmacs[idx] = mac
                 
     finally:
         gc.enable()
-        if not executor and use_processes:
+        if pool is not executor:
             pool.shutdown()
 
-    # 5. Finalize
+    # 6. Finalize
     os.replace(str(tmp), str(dst))
 
     if write_manifest:
+        # Per-chunk MACs + offset table go to the binary sidecar; JSON keeps only the small header.
+        # Offsets come straight from the writer grid (ciphertext starts after its length prefix).
+        offsets = [(HEADER_SIZE + idx * (LEN_PREFIX_SIZE + chunk_size) + LEN_PREFIX_SIZE,
+                    min(chunk_size, filesize - idx * chunk_size))
+                   for idx in range(chunk_count)]
+        _write_mac_sidecar(macs_path, chunk_size, chunk_hmacs, offsets)
         m = {
             "mode": "CTR_CHUNKED",
             "base_nonce": base_nonce.hex(),
             "chunk_size": chunk_size,
             "chunk_count": chunk_count,
             "key_id": key_id,
-            "chunk_hmacs": chunk_hmacs, # Only thing that needs order
-            "version": 1
+            "version": 3
         }
         manifest.write_text(json.dumps(m))
 
     try: store_key(key_id, key, "ctr", master_secret)
     except: pass
 
-# Import needed for HMAC inside function
-import hmac 
+def _scan_offsets(enc_path: Path, chunk_count: int):
+    # SCATTER-READ STRATEGY (older manifests without an offset table)
+    # The file is mapped ONCE; we only scan the 8-byte length prefixes to build
+    # an (offset, length) table. Workers map the same file themselves, so a
+    # chunk travels over IPC as two ints instead of multi-MB bytes.
+    # Writer grid: HEADER_SIZE + (idx * (LEN + chunk_size)); every chunk except
+    # the last is full, so the grid is packed and a sequential scan is exact.
+    offsets = []
+    with open(enc_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Verify Header
+        if mm[:5] != HEADER_MAGIC: raise ValueError("Invalid header")
+        
+        pos = HEADER_SIZE # Skip header
+        for _ in range(chunk_count):
+            if pos + LEN_PREFIX_SIZE > len(mm): break
+            l = int.from_bytes(mm[pos : pos + LEN_PREFIX_SIZE], "big")
+            pos += LEN_PREFIX_SIZE
+            if pos + l > len(mm): break
+            offsets.append((pos, l))
+            pos += l
+
+    if len(offsets) != chunk_count: raise ValueError("Truncated file")
+    return offsets
 
 def decrypt_file_chunked(enc_path: Path, out_path: Path, key_id: str=None, 
                          master_secret: str = None, 
                          use_processes: bool=True, workers: int=4,
-                         executor=None):
+                         executor=None, manifest_data: dict=None):
     enc_path = Path(enc_path)
     out_path = Path(out_path)
     manifest = enc_path.with_suffix(enc_path.suffix + ".meta.json")
     
-    if not manifest.exists(): raise FileNotFoundError("Manifest required")
-    m = json.loads(manifest.read_text())
+    # Caller (run_decrypt) may already have parsed the manifest - don't read it twice
+    if manifest_data is not None:
+        m = manifest_data
+    else:
+        if not manifest.exists(): raise FileNotFoundError("Manifest required")
+        m = json.loads(manifest.read_text())
     base_nonce = bytes.fromhex(m["base_nonce"])
     chunk_size = int(m["chunk_size"])
     keyid = m.get("key_id") if key_id is None else key_id
 
     if not master_secret: raise ValueError("Master secret required")
     key, mode = load_key(keyid, master_secret)
-    
-    # SCATTER-READ STRATEGY
-    # We don't need to read sequentially either.
-    
+    auth_key = _derive_auth_key(key)
+
     chunk_count = m["chunk_count"]
-    
-    # 1. Launch Tasks
-    args_list = []
-    
-    # We must open file to read offsets? 
-    # Actually, since we enforce fixed structure, we can predict read offsets too!
-    
-    with open(enc_path, "rb") as f:
-        # Verify Header
-        if f.read(5) != HEADER_MAGIC: raise ValueError("Invalid header")
-        
-        # Since we used "Sparse/Seek" writing, the file on disk might have gaps 
-        # if we didn't fill it perfectly, but we did.
-        # However, reading involves checking length prefixes.
-        
-        # Optimization: Just read the whole thing into mmap and slice it up?
-        # For decryption, we can't easily use mmap for *variable* length records 
-        # if we didn't enforce strict size. 
-        # But in our encryptor, we did: write_pos = ... idx * (LEN + chunk_size)
-        # This essentially padded the file to fixed blocks (except last).
-        
-        # So we can use calculated offsets for decryption too!
-        pass
 
-    # Since decryption logic is complex to scatter-gather safely without strict 
-    # validation, let's stick to the robust read-all-headers approach but 
-    # parallelize execution rapidly.
-    
-    chunks_data = []
-    with open(enc_path, "rb") as f:
-        f.seek(HEADER_SIZE) # Skip header
-        
-        for _ in range(chunk_count):
-            # In our fixed-grid format, we can seek!
-            # This is faster than reading linearly if OS buffers are smart.
-            len_bytes = f.read(8)
-            if not len_bytes: break
-            l = int.from_bytes(len_bytes, "big")
-            ct = f.read(l)
-            chunks_data.append(ct)
-            
-            # If this wasn't the last chunk, and l < chunk_size, we might need to seek forward
-            # to the next grid slot?
-            # Our encryptor writes to: HEADER_SIZE + (idx * (LEN + chunk_size))
-            # If actual data was smaller (last chunk), the next chunk starts far away.
-            # But loop assumes packed.
-            
-            # CRITICAL FIX for reading "Sparse/Grid" files:
-            # We must seek to the next grid position after reading, 
-            # unless we simply read sequentially and assume the file is packed.
-            
-            # If we used seek() in writer, we created holes (sparse file) or overwritten.
-            # Simpler approach for Decryptor compatibility:
-            # Just read sequentially. The writer produced a valid stream?
-            # No, the writer used seek(). If chunk 1 is 5 bytes but chunk_size is 10,
-            # writer put chunk 2 at offset 10+8. There is a gap!
-            
-            # To fix this complexity: The Writer logic above assumes input 
-            # was FULL chunks. Elastic chunking ensures this for all except last.
-            # So no gaps exist for 0..N-1. 
-            # So sequential read is safe.
-            pass
-
-    # Parallel Decrypt
-    args_list = [(key, base_nonce, i, ct) for i, ct in enumerate(chunks_data)]
-    results = [None] * len(args_list)
+    # Expected chunk MACs: binary sidecar (v2/v3) or hex list inside the JSON (v1)
+    offsets = None
+    if "chunk_hmacs" in m:
+        macs_blob = b"".join(bytes.fromhex(h) for h in m["chunk_hmacs"])
+    else:
+        macs_blob, offsets = _read_mac_sidecar(enc_path.with_suffix(enc_path.suffix + ".meta.bin"),
+                                               chunk_size, chunk_count)
+
+    if offsets is not None:
+        # v3: manifest already has the (offset, length) table - just check the
+        # header magic and that every chunk lies inside the file. No scan.
+        with open(enc_path, "rb") as f:
+            if f.read(5) != HEADER_MAGIC: raise ValueError("Invalid header")
+            file_len = os.fstat(f.fileno()).st_size
+        if any(off < HEADER_SIZE + LEN_PREFIX_SIZE or off + l > file_len for off, l in offsets):
+            raise ValueError("Truncated file")
+    else:
+        offsets = _scan_offsets(enc_path, chunk_count)
+
+    # Parallel Verify + Decrypt (each worker checks its own chunk MAC)
+    # Lazily, one tuple per submitted chunk
+    def _tasks():
+        for i, (off, l) in enumerate(offsets):
+            yield (key, auth_key, base_nonce, i, str(enc_path), off, l,
+                   macs_blob[i * MAC_SIZE : (i + 1) * MAC_SIZE])
     
-    # Use Global Pool
+    # Use Global Pool; fallback pool is 'spawn' like the app's (callers may be threaded)
     if executor and use_processes:
-        futures = {executor.submit(_worker_decrypt_chunk, a): i for i, a in enumerate(args_list)}
+        pool = executor
     else:
-        pool = ProcessPoolExecutor(max_workers=workers)
-        futures = {pool.submit(_worker_decrypt_chunk, a): i for i, a in enumerate(args_list)}
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
         
     # Scatter-Write Decrypted
     tmp = out_path.with_suffix(out_path.suffix + ".tmp")
     
-    with open(tmp, "wb") as out:
-        for fut in as_completed(futures):
-            idx, pt = fut.result()
-            # Calculate plaintext offset
-            # Plaintext is just pure data, no length prefixes.
-            # Pos = idx * chunk_size
-            out.seek(idx * chunk_size)
-            out.write(pt)
-            del pt
+    # Bounded in-flight window (same as encrypt): at most 2x workers plaintext
+    # chunks exist at once. A finished future is dropped from the set BEFORE its
+    # chunk is written, so the driver never holds the whole file in RAM.
+    tasks = _tasks()
+    max_inflight = 2 * max(1, workers)
+    inflight = set()
+    try:
+        with open(tmp, "wb") as out:
+            # Plaintext size is known from the length table
+            _preallocate(out, sum(l for _, l in offsets))
+            while True:
+                while len(inflight) < max_inflight:
+                    a = next(tasks, None)
+                    if a is None: break
+                    inflight.add(pool.submit(_worker_decrypt_chunk, a))
+                if not inflight: break
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    idx, pt = fut.result()
+                    # Plaintext is just pure data, no length prefixes.
+                    # Pos = idx * chunk_size
+                    out.seek(idx * chunk_size)
+                    out.write(pt)
+                    del pt
+                del done
+    except Exception:
+        # A chunk failed verification: never leave partial plaintext behind.
+        # Only the current window can still be queued/running.
+        for fut in inflight: fut.cancel()
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    finally:
+        if pool is not executor:
+            pool.shutdown()
 
     os.replace(str(tmp), str(out_path))
@@ -10,6 +10,29 @@ from .packager import make_archive
 from .decryptor import decrypt_file
 from .chunked_ctr import encrypt_file_chunked, decrypt_file_chunked
 
+# Below this much total work, threads beat processes (no spawn/pickle cost)
+PROCESS_THRESHOLD = 16 * 1024 * 1024
+# CTR files this big use the chunked format (parallel chunks + per-chunk MAC)
+CHUNKED_THRESHOLD = 16 * 1024 * 1024
+
+def walk(root) -> List[Tuple[Path, int, str]]:
+    """
+    Recursive os.scandir listing of every file under root as (path, size, suffix).
+    DirEntry caches d_type and stat(), so each file costs at most ONE stat
+    (rglob + is_file() + stat() paid two or three).
+    """
+    info = []
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.is_file():
+                    p = Path(e.path)
+                    info.append((p, e.stat().st_size, p.suffix.lower()))
+    return info
+
 def _calculate_elastic_chunk_size(file_size: int, workers: int) -> int:
     if file_size == 0: return 1024 * 1024
     target_chunk_count = workers * 4
@@ -22,13 +45,48 @@ def _calculate_elastic_chunk_size(file_size: int, workers: int) -> int:
     if ideal_size == 0: ideal_size = 16
     return int(ideal_size)
 
+def _group_small(tasks, target: int, min_groups: int):
+    """
+    Next-fit packing in plan order (keeps the scheduler's priority order):
+    consecutive tasks go into one group until it holds ~target bytes. Target
+    shrinks for small batches so there are still >= min_groups groups.
+    """
+    total = sum(t.size for t in tasks)
+    target = max(1, min(target, total // max(1, min_groups)))
+    groups, cur, cur_size = [], [], 0
+    for t in tasks:
+        cur.append(t)
+        cur_size += t.size
+        if cur_size >= target:
+            groups.append(cur)
+            cur, cur_size = [], 0
+    if cur: groups.append(cur)
+    return groups
+
+def _encrypt_group(group, in_dir: Path, out_dir: Path, mode: str, key_id: str, key: bytes, master_secret: str):
+    # One thread task = many small files; errors are per file, not per group
+    results = []
+    for task in group:
+        p = task.path
+        rel = p.relative_to(in_dir)
+        outp = out_dir / rel.with_suffix(rel.suffix + ".enc")
+        try:
+            outp.parent.mkdir(parents=True, exist_ok=True)
+            encrypt_stream(str(p), str(outp), mode, key_id, key, master_secret)
+            results.append((task, None))
+        except Exception as e:
+            results.append((task, e))
+    return results
+
 def run_encrypt(in_dir: str, out_dir: str, mode: str, master_secret: str,
                 workers: int=4, 
-                use_processes: bool=False, 
+                use_processes: bool=True, 
                 policy: str='priority', 
                 chunk_size: int = (DEFAULT_CHUNK_MB * 1024 * 1024),
                 scheduler=None, 
-                executor=None
+                executor=None,
+                archive: bool=True,
+                compress: bool=False
                 ) -> Tuple[float, str]: 
     
     t_start = time.time() 
@@ -36,30 +94,27 @@ def run_encrypt(in_dir: str, out_dir: str, mode: str, master_secret: str,
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     
-    files = [p for p in in_dir.rglob("*") if p.is_file()]
-    if not files: return 0.0, ""
+    info = walk(in_dir)
+    if not info: return 0.0, ""
 
     # --- PLAN ---
     current_scheduler = scheduler if scheduler else SchedulerPlus(max_workers=workers)
 
     if policy == 'priority':
-        plan = current_scheduler.plan(files) 
+        plan = current_scheduler.plan_from_info(info) 
     else:
-        plan = [Task(prio=idx, path=p, size=p.stat().st_size, suffix=p.suffix.lower()) 
-                for idx, p in enumerate(files)]
+        plan = [Task(prio=idx, path=p, size=size, suffix=suffix) 
+                for idx, (p, size, suffix) in enumerate(info)]
 
     in_dir_hash = hashlib.sha256(str(in_dir).encode()).hexdigest()[:16]
     key_id = f"{in_dir_hash}-{mode}-{int(t_start)}"
     key = gen_key() 
     
-    # Threshold lowered to 16MB because Elastic Chunking is efficient
-    HEAVY_THRESHOLD = 16 * 1024 * 1024 
-    
     big_tasks = []
     small_tasks = []
     
     for t in plan:
-        if t.size >= HEAVY_THRESHOLD and mode.lower() == 'ctr':
+        if t.size >= CHUNKED_THRESHOLD and mode.lower() == 'ctr':
             big_tasks.append(t)
         else:
             small_tasks.append(t)
@@ -77,108 +132,126 @@ def run_encrypt(in_dir: str, out_dir: str, mode: str, master_secret: str,
             outp.parent.mkdir(parents=True, exist_ok=True)
             try:
                 encrypt_stream(str(p), str(outp), mode, key_id, key, master_secret)
-                current_scheduler.observe(p, 0.001) # Minimal cost
+                current_scheduler.observe(p, 0.001, task.size) # Minimal cost
             except Exception as e:
                 print(f"Error {p}: {e}")
         
         # OPTIMIZATION B: The "Hyper-Threaded" Batch
         # For multiple small files, we are I/O bound (waiting for disk).
         # We increase workers to 4x to keep the disk queue full.
+        # Files are packed into groups of ~chunk_size bytes, one thread task per
+        # group: thousands of tiny files no longer mean thousands of futures.
         else:
-            with ThreadPoolExecutor(max_workers=workers * 4) as tex:
-                futures = {}
-                for task in small_tasks:
-                    p = task.path
-                    rel = p.relative_to(in_dir)
-                    outp = out_dir / rel.with_suffix(rel.suffix + ".enc")
-                    outp.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    f = tex.submit(encrypt_stream, str(p), str(outp), mode, key_id, key, master_secret)
-                    futures[f] = p
+            groups = _group_small(small_tasks, chunk_size, workers * 4)
+            with ThreadPoolExecutor(max_workers=min(workers * 4, len(groups))) as tex:
+                futures = [tex.submit(_encrypt_group, g, in_dir, out_dir, mode, key_id, key, master_secret)
+                           for g in groups]
 
                 for f in as_completed(futures):
-                    p = futures[f]
-                    try: 
-                        f.result()
-                        current_scheduler.observe(p, 0.01) 
-                    except Exception as e: 
-                        print(f"Error {p}: {e}")
+                    for task, err in f.result():
+                        if err is None:
+                            current_scheduler.observe(task.path, 0.01, task.size)
+                        else:
+                            print(f"Error {task.path}: {err}")
 
     # --- 2. LARGE TASKS STRATEGY (ProcessPool + Elastic Chunking) ---
     if big_tasks:
-        for task in big_tasks:
-            p = task.path
-            rel = p.relative_to(in_dir)
-            outp = out_dir / rel.with_suffix(rel.suffix + ".enc")
-            outp.parent.mkdir(parents=True, exist_ok=True)
+        # One pool for ALL big files. Creating it per file re-forks the workers
+        # (and re-imports cryptography) every time, ~200ms each.
+        pool = executor
+        if use_processes and pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            for task in big_tasks:
+                p = task.path
+                rel = p.relative_to(in_dir)
+                outp = out_dir / rel.with_suffix(rel.suffix + ".enc")
+                outp.parent.mkdir(parents=True, exist_ok=True)
             
-            # Elastic Chunking
-            elastic_chunk = _calculate_elastic_chunk_size(task.size, workers)
+                # Elastic Chunking
+                elastic_chunk = _calculate_elastic_chunk_size(task.size, workers)
             
-            t0 = time.time()
-            try:
-                encrypt_file_chunked(
-                    src=p, dst=outp, key=key, key_id=key_id,
-                    master_secret=master_secret,
-                    chunk_size=elastic_chunk, 
-                    workers=workers,
-                    use_processes=True,
-                    executor=executor
-                )
-                elapsed = time.time() - t0
-                current_scheduler.observe(p, elapsed)
-            except Exception as e:
-                print(f"Error Chunked {p}: {e}")
+                t0 = time.time()
+                try:
+                    encrypt_file_chunked(
+                        src=p, dst=outp, key=key, key_id=key_id,
+                        master_secret=master_secret,
+                        chunk_size=elastic_chunk, 
+                        workers=workers,
+                        use_processes=use_processes,
+                        executor=pool
+                    )
+                    elapsed = time.time() - t0
+                    current_scheduler.observe(p, elapsed, task.size)
+                except Exception as e:
+                    print(f"Error Chunked {p}: {e}")
+        finally:
+            if pool is not executor:
+                pool.shutdown()
 
     t_end_encryption = time.time()
+    # Timing-only runs (compare baseline) don't need a ZIP nobody downloads
+    if not archive: return (t_end_encryption - t_start), ""
     archive_name = f"encrypted_{policy}_{int(t_start)}.zip"
-    arch_path = make_archive(out_dir, archive_name=archive_name)
+    # ZIP_STORED by default: ciphertext is incompressible, DEFLATE only burns CPU
+    arch_path = make_archive(out_dir, archive_name=archive_name, compress=compress)
     
     return (t_end_encryption - t_start), arch_path
 
-# (run_decrypt remains unchanged from previous version, assuming you have it)
 def run_decrypt(in_dir: str, out_dir: str, master_secret: str, workers: int=4, 
-                use_processes: bool=False, executor=None):
+                use_processes: bool=True, executor=None):
     in_dir = Path(in_dir)
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-    files = [p for p in in_dir.rglob("*.enc") if p.is_file()]
-    if not files:
+    info = [(p, size) for p, size, suffix in walk(in_dir) if suffix == ".enc"]
+    if not info:
         payload = in_dir / "payload"
-        if payload.exists(): files = [p for p in payload.rglob("*.enc") if p.is_file()]
-    
+        if payload.exists(): info = [(p, size) for p, size, suffix in walk(payload) if suffix == ".enc"]
+
+    # Tiny jobs: process startup costs more than the AES work itself
+    if sum(size for _, size in info) < PROCESS_THRESHOLD:
+        use_processes = False
+
+    jobs = [_plan_decrypt_task(p, in_dir, out_dir) for p, _ in info]
+
     if executor and use_processes:
-        futures = []
-        for p in files:
-            _submit_decrypt_task(p, in_dir, out_dir, master_secret, workers, use_processes, futures, executor)
-        for f in as_completed(futures):
-            try: f.result()
-            except: pass
+        _run_decrypt_jobs(jobs, master_secret, workers, use_processes, executor)
     else:
         exec_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
         with exec_cls(max_workers=workers) as ex:
-            futures = []
-            for p in files:
-                _submit_decrypt_task(p, in_dir, out_dir, master_secret, workers, use_processes, futures, ex)
-            for f in as_completed(futures):
-                try: f.result()
-                except: pass
-
-def _submit_decrypt_task(p, in_dir, out_dir, master_secret, workers, use_processes, futures_list, executor):
+            _run_decrypt_jobs(jobs, master_secret, workers, use_processes, ex)
+
+def _plan_decrypt_task(p, in_dir, out_dir):
     rel = p.relative_to(in_dir)
     outp_name = ".".join(rel.name.split('.')[:-1]) if '.enc' in rel.name else rel.name + ".dec"
     meta = p.with_suffix(p.suffix + ".meta.json")
-    key_id, is_chunked = None, False
+    # Manifest is parsed exactly once here and handed on with the job
+    md = {}
     if meta.exists():
-        try:
-            md = json.loads(meta.read_text())
-            if "src" in md: outp_name = md["src"]
-            key_id = md.get("key_id")
-            is_chunked = md.get("mode") == "CTR_CHUNKED"
+        try: md = json.loads(meta.read_text())
         except: pass
+    outp_name = md.get("src", outp_name)
+    key_id = md.get("key_id")
+    is_chunked = md.get("mode") == "CTR_CHUNKED"
     outp = out_dir / rel.parent / outp_name
     outp.parent.mkdir(parents=True, exist_ok=True)
-    if is_chunked:
-        futures_list.append(executor.submit(decrypt_file_chunked, p, outp, key_id, master_secret, use_processes, workers, executor))
-    else:
-        futures_list.append(executor.submit(decrypt_file, str(p), str(outp), key_id, master_secret))
+    return p, outp, key_id, is_chunked, md
+
+def _run_decrypt_jobs(jobs, master_secret, workers, use_processes, executor):
+    # Whole files go to the pool first, so they run while the big files are being chunked
+    futures = [executor.submit(decrypt_file, str(p), str(outp), key_id, master_secret)
+               for p, outp, key_id, is_chunked, md in jobs if not is_chunked]
+
+    # Chunked files fan out over the same pool themselves. Submitting them *into*
+    # the pool would nest pools (and the executor can't be pickled).
+    for p, outp, key_id, is_chunked, md in jobs:
+        if not is_chunked: continue
+        try:
+            decrypt_file_chunked(p, outp, key_id, master_secret, use_processes, workers, executor,
+                                 manifest_data=md)
+        except Exception as e:
+            print(f"Error Chunked {p}: {e}")
+
+    for f in as_completed(futures):
+        try: f.result()
+        except: pass
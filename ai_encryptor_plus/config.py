@@ -12,3 +12,7 @@ CHECKPOINT_PATH = os.environ.get("AI_ENC_CKP", "out/checkpoint.json")
 DEFAULT_CHUNK_MB = int(os.environ.get("AI_ENC_CHUNK_MB", "8"))
 # ARCHIVE_NAME: encrypted outputs ka archive filename. Env AI_ENC_ARCHIVE se change kar sakte ho.
 ARCHIVE_NAME = os.environ.get("AI_ENC_ARCHIVE", "encrypted_outputs.zip")
+# MAX_UPLOAD_BYTES: ek request ka max upload size (bytes). Env AI_ENC_MAX_UPLOAD, default 4 GiB.
+MAX_UPLOAD_BYTES = int(os.environ.get("AI_ENC_MAX_UPLOAD", str(4 * 1024 ** 3)))
+# DISK_HEADROOM: upload se kitne guna free disk chahiye (input + output + archive).
+DISK_HEADROOM = 3
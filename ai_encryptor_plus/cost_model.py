@@ -22,6 +22,14 @@ class CostModel:
         # chunk_size aur suffix pass karte hain; sample optional hai.
         return self.adaptive.predict(chunk_size, suffix, sample)
 
+    def predict_seconds_batch(self, *, sizes, suffixes):
+        """
+        Predict encryption time for many files in one vectorized call.
+        """
+        # Suffix ko slot index mein badlo, phir ek hi NumPy operation mein sab predict
+        idx = [self.adaptive.suffix_index(s) for s in suffixes]
+        return self.adaptive.predict_batch(sizes, idx)
+
     def observe(self, *, chunk_size: int, suffix: str, actual_s: float, sample=None):
         """
         Update model with real observed time.
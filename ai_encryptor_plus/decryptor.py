@@ -2,12 +2,11 @@ import os, json, hashlib
 from pathlib import Path
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from ._ctr_backend import aes_ctr
 from .key_vault import load_key
 
 def _aes_ctr(key: bytes, nonce16: bytes, data: bytes) -> bytes:
-    cipher = Cipher(algorithms.AES(key), modes.CTR(nonce16))
-    dec = cipher.decryptor()
-    return dec.update(data) + dec.finalize()
+    return aes_ctr(key, nonce16, data)
 
 def _aes_gcm_decrypt(key: bytes, nonce12: bytes, data: bytes) -> bytes:
     a = AESGCM(key)
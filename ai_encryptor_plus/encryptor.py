@@ -3,6 +3,7 @@ from pathlib import Path
 from typing import Tuple
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from ._ctr_backend import aes_ctr, ctr_stream
 from .key_vault import store_key
 
 def gen_key() -> bytes:
@@ -11,18 +12,22 @@ def gen_key() -> bytes:
 
 def _aes_ctr(key: bytes, nonce16: bytes, data: bytes) -> bytes:
     # CTR mode mein encryption karo
-    cipher = Cipher(algorithms.AES(key), modes.CTR(nonce16))
-    enc = cipher.encryptor()
-    return enc.update(data) + enc.finalize()
+    return aes_ctr(key, nonce16, data)
 
 def _aes_gcm(key: bytes, nonce12: bytes, data: bytes) -> bytes:
     # GCM mode mein authenticated encryption karo
     a = AESGCM(key)
     return a.encrypt(nonce12, data, None)
 
+def _advise_sequential(f):
+    # Kernel ko batao ki file aage se peeche tak padhi jayegi (bigger readahead)
+    if hasattr(os, "posix_fadvise"):
+        try: os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError: pass
+
 # --- MODIFICATION ---
 # Added 'master_secret' argument.
-def encrypt_stream(path: str, out_path: str, mode: str, key_id: str, key: bytes, master_secret: str, chunk_size_bytes: int=1024*1024):
+def encrypt_stream(path: str, out_path: str, mode: str, key_id: str, key: bytes, master_secret: str, chunk_size_bytes: int=4*1024*1024):
     # Temp file mein likho phir atomic replace karo
     out_p = Path(out_path)
     tmp = out_p.with_suffix(out_p.suffix + ".tmp")
@@ -32,14 +37,20 @@ def encrypt_stream(path: str, out_path: str, mode: str, key_id: str, key: bytes,
     base_meta = {"key_id": key_id, "src": Path(path).name}
     
     with open(path, "rb") as f, open(tmp, "wb") as g:
+        _advise_sequential(f)
         if mode.lower() == "ctr":
             # CTR mode: random nonce generate karo
             nonce = secrets.token_bytes(16)
             g.write(b"CTR"+nonce)  # header likho
+            # Ek hi keystream poori file par chalao (counter har chunk par reset nahi hona chahiye)
+            enc = ctr_stream(key, nonce)
+            # Ek hi buffer baar baar reuse karo (readinto) - har read par naya bytes object nahi
+            buf = bytearray(chunk_size_bytes)
+            mv = memoryview(buf)
             while True:
-                chunk = f.read(chunk_size_bytes)
-                if not chunk: break
-                g.write(_aes_ctr(key, nonce, chunk))
+                n = f.readinto(buf)
+                if not n: break
+                g.write(enc(mv[:n]))
             meta_data = {**base_meta, "mode":"CTR","nonce":nonce.hex(),"chunked":False}
         elif mode.lower() == "gcm":
             # GCM mode: puri file ek saath encrypt karo (tag ke liye)
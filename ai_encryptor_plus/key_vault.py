@@ -1,14 +1,69 @@
 from __future__ import annotations
-import os, sqlite3, secrets, time
+import os, sqlite3, secrets, time, hashlib, threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes, padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from .config import VAULT_DB, MASTER_ENV
 
-def _kdf(master: str, salt: bytes) -> bytes:
+# PBKDF2 (200k iterations) ~150ms per call - many files share one key_id, so
+# derived wrap keys are cached. Cache key = SHA256(master) + salt, taaki
+# password khud cache key ke roop mein memory mein na rahe.
+_KDF_CACHE_SIZE = 32
+_KDF_CACHE = OrderedDict()
+_KDF_LOCK = threading.Lock()
+
+def derive_key(master: str, salt: bytes) -> bytes:
+    """PBKDF2-SHA256 wrap key for (master, salt); repeated calls hit the LRU cache."""
+    cache_key = (hashlib.sha256(master.encode()).digest(), bytes(salt))
+    with _KDF_LOCK:
+        if cache_key in _KDF_CACHE:
+            _KDF_CACHE.move_to_end(cache_key)
+            return _KDF_CACHE[cache_key]
     # Master secret se encryption key derive karte hain
     kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=200_000)
-    return kdf.derive(master.encode())
+    wrap_k = kdf.derive(master.encode())
+    with _KDF_LOCK:
+        _KDF_CACHE[cache_key] = wrap_k
+        if len(_KDF_CACHE) > _KDF_CACHE_SIZE:
+            _KDF_CACHE.popitem(last=False)
+    return wrap_k
+
+# Keys already wrapped + stored by THIS process: key_id -> fingerprint of
+# (raw_key, mode, master). One run stores the same key_id once per file -
+# with a fresh salt each time that was one full PBKDF2 per file.
+_STORED_CACHE_SIZE = 256
+_STORED = OrderedDict()
+_STORE_LOCK = threading.Lock() # guards _STORED/_KEY_LOCKS only, never held across PBKDF2
+# key_id -> [Lock, users]: only files of the SAME run wait on the first wrap;
+# unrelated requests wrap their own keys in parallel
+_KEY_LOCKS = {}
+
+@contextmanager
+def _key_lock(key_id: str):
+    with _STORE_LOCK:
+        ent = _KEY_LOCKS.get(key_id)
+        if ent is None:
+            ent = _KEY_LOCKS[key_id] = [threading.Lock(), 0]
+        ent[1] += 1
+    try:
+        with ent[0]:
+            yield
+    finally:
+        with _STORE_LOCK:
+            ent[1] -= 1
+            if ent[1] == 0: _KEY_LOCKS.pop(key_id, None)
+
+def _already_stored(key_id: str, fp: bytes) -> bool:
+    with _STORE_LOCK:
+        if _STORED.get(key_id) == fp:
+            _STORED.move_to_end(key_id)
+            return True
+    return False
+
+def _fingerprint(raw_key: bytes, mode: str, master: str) -> bytes:
+    return hashlib.sha256(raw_key + mode.encode() + hashlib.sha256(master.encode()).digest()).digest()
 
 def _aes_cbc_encrypt(k: bytes, iv: bytes, pt: bytes) -> bytes:
     # Plaintext ko AES-CBC se encrypt karte hain
@@ -42,10 +97,30 @@ def _ensure_schema(conn: sqlite3.Connection):
     )""")
     conn.commit()
 
+# One long-lived connection per process instead of connect() on every call.
+_CONN = None
+_CONN_LOCK = threading.Lock()
+
+def _conn() -> sqlite3.Connection:
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect(VAULT_DB, timeout=10.0, check_same_thread=False)
+        _ensure_schema(_CONN)
+    return _CONN
+
+def _reset_after_fork():
+    # Forked pool workers must not reuse the parent's sqlite handle or locks
+    global _CONN, _CONN_LOCK, _KDF_LOCK, _STORE_LOCK, _KEY_LOCKS
+    _CONN, _CONN_LOCK, _KDF_LOCK, _STORE_LOCK = None, threading.Lock(), threading.Lock(), threading.Lock()
+    _KEY_LOCKS = {}
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 def init():
     # Database initialize karte hain
-    with sqlite3.connect(VAULT_DB) as c:
-        _ensure_schema(c)
+    with _CONN_LOCK:
+        _conn()
 
 def store_key(key_id: str, raw_key: bytes, mode: str, master_secret: str) -> None:
     # Key ko vault mein store karte hain
@@ -53,27 +128,37 @@ def store_key(key_id: str, raw_key: bytes, mode: str, master_secret: str) -> Non
     if not master_secret:
         raise ValueError("Master secret cannot be empty for storing a key")
     
-    import secrets
-    salt = secrets.token_bytes(16)
-    wrap_k = _kdf(master_secret, salt)
-    iv = secrets.token_bytes(16)
-    wrapped = _aes_cbc_encrypt(wrap_k, iv, raw_key)
-    with sqlite3.connect(VAULT_DB, timeout=10.0) as c: # Added timeout
-        c.execute("REPLACE INTO keys(id,created_at,salt,iv,wrapped_key,mode) VALUES(?,?,?,?,?,?)",
-                  (key_id, int(time.time()), salt, iv, wrapped, mode))
-        c.commit()
+    fp = _fingerprint(raw_key, mode, master_secret)
+    if _already_stored(key_id, fp): return
+    # Per key_id lock held across the wrap: parallel files of one run wait for
+    # the first PBKDF2 and then return via _STORED instead of each deriving again
+    with _key_lock(key_id):
+        if _already_stored(key_id, fp): return
+        salt = secrets.token_bytes(16)
+        wrap_k = derive_key(master_secret, salt)
+        iv = secrets.token_bytes(16)
+        wrapped = _aes_cbc_encrypt(wrap_k, iv, raw_key)
+        with _CONN_LOCK:
+            c = _conn()
+            c.execute("REPLACE INTO keys(id,created_at,salt,iv,wrapped_key,mode) VALUES(?,?,?,?,?,?)",
+                      (key_id, int(time.time()), salt, iv, wrapped, mode))
+            c.commit()
+        with _STORE_LOCK:
+            _STORED[key_id] = fp
+            if len(_STORED) > _STORED_CACHE_SIZE:
+                _STORED.popitem(last=False)
 
 def load_key(key_id: str, master_secret: str):
     if not master_secret:
         raise ValueError("Master secret is required to load a key")
 
     # Database se encrypted key nikaalte hain
-    with sqlite3.connect(VAULT_DB) as c:
-        row = c.execute("SELECT salt,iv,wrapped_key,mode FROM keys WHERE id=?",(key_id,)).fetchone()
-        if not row:
-            raise KeyError(f"key '{key_id}' nahi mila")
-        salt, iv, wrapped, mode = row
+    with _CONN_LOCK:
+        row = _conn().execute("SELECT salt,iv,wrapped_key,mode FROM keys WHERE id=?",(key_id,)).fetchone()
+    if not row:
+        raise KeyError(f"key '{key_id}' nahi mila")
+    salt, iv, wrapped, mode = row
     # Key ko decrypt karte hain aur return karte hain
-    wrap_k = _kdf(master_secret, salt)
+    wrap_k = derive_key(master_secret, salt)
     raw = _aes_cbc_decrypt(wrap_k, iv, wrapped)
     return raw, mode
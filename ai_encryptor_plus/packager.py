@@ -1,7 +1,7 @@
-import os, zipfile
+import os, zipfile, shutil
 from pathlib import Path
 
-def make_archive(out_dir: str, archive_name: str="encrypted_outputs.zip"):
+def make_archive(out_dir: str, archive_name: str="encrypted_outputs.zip", compress: bool=False):
     # out_dir ko Path object mein convert karo
     out_dir = Path(out_dir)
     # archive ka path banao
@@ -11,7 +11,11 @@ def make_archive(out_dir: str, archive_name: str="encrypted_outputs.zip"):
     # ZIP_DEFLATED (your old code) is very slow for .mp4 files.
     # ZIP_STORED just stores the file and is almost instantaneous.
     # This is the fix for your 44-second bottleneck.
-    with zipfile.ZipFile(arch_path, "w", compression=zipfile.ZIP_STORED) as z:
+    # Ciphertext is random-looking, DEFLATE can't shrink it - only opt in via compress=True.
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    # 8 MB write buffer: big sequential writes instead of many small ones
+    with open(arch_path, "wb", buffering=8 * 1024 * 1024) as raw, \
+         zipfile.ZipFile(raw, "w", compression=compression, allowZip64=True) as z:
     # --- END MODIFICATION ---
     
         # out_dir ke andar sab files ko recursively iterate karo
@@ -22,3 +26,44 @@ def make_archive(out_dir: str, archive_name: str="encrypted_outputs.zip"):
     
     # archive ka path string format mein return karo
     return str(arch_path)
+
+# Encrypted members are multi-MB blobs: copy in big steps, not zipfile's 64KB default
+EXTRACT_BUF = 4 * 1024 * 1024
+
+def _extract_batch(zip_path: str, dest_dir: str, names):
+    # Runs in a pool worker: own ZipFile handle (handles can't be shared across processes)
+    out = []
+    with zipfile.ZipFile(zip_path, "r", allowZip64=True) as z:
+        for name in names:
+            target = Path(dest_dir) / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # z.open streams the member; no extra temp copy
+            with z.open(name) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, EXTRACT_BUF)
+            out.append(str(target))
+    return out
+
+def extract_archive(zip_path: str, dest_dir: str, executor=None, workers: int=4):
+    """
+    Secure extract: skips dirs and any member that would land outside dest_dir.
+    With an executor, members are split into ~workers batches and extracted in
+    parallel (CRC + inflate + write overlap across cores).
+    """
+    dest_dir = Path(dest_dir).resolve()
+    with zipfile.ZipFile(zip_path, "r", allowZip64=True) as z:
+        names = []
+        for m in z.infolist():
+            if m.is_dir(): continue
+            target = (dest_dir / m.filename).resolve()
+            # Path traversal guard ("../", absolute names)
+            if os.path.commonpath([str(dest_dir), str(target)]) != str(dest_dir): continue
+            names.append(m.filename)
+
+    # Single member (or no pool): serial, nothing to overlap
+    if executor is None or len(names) < 2:
+        return [Path(p) for p in _extract_batch(str(zip_path), str(dest_dir), names)]
+
+    n = max(1, min(workers, len(names)))
+    batches = [names[i::n] for i in range(n)]
+    futures = [executor.submit(_extract_batch, str(zip_path), str(dest_dir), b) for b in batches]
+    return [Path(p) for f in futures for p in f.result()]
@@ -1,7 +1,6 @@
 # ai_encryptor_plus/scheduler_plus.py
-import heapq
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 from .cost_model import CostModel
 
 class Task:
@@ -21,9 +20,15 @@ class SchedulerPlus:
     def plan(self, files: List[Path]) -> List[Task]:
         # Files ko priority ke saath schedule karta hai
         
-        if not files: return []
+        # Stat every file exactly ONCE: (path, size, suffix)
+        return self.plan_from_info([(p, p.stat().st_size, p.suffix.lower()) for p in files])
 
-        total_size = sum(p.stat().st_size for p in files)
+    def plan_from_info(self, info: List[Tuple[Path, int, str]]) -> List[Task]:
+        # Same as plan(), but sizes are already known (e.g. from an os.scandir walk)
+        
+        if not info: return []
+
+        total_size = sum(size for _, size, _ in info)
 
         # --- OS SCHEDULING OPTIMIZATION ---
         # Threshold: 10 MB.
@@ -33,25 +38,23 @@ class SchedulerPlus:
         # This guarantees we are faster than FIFO for small batches.
         if total_size < 10 * 1024 * 1024: 
             # Create tasks with priority = size (Smaller size = Higher priority)
-            raw_tasks = [Task(p.stat().st_size, p, p.stat().st_size, p.suffix.lower()) for p in files]
+            raw_tasks = [Task(size, p, size, suffix) for p, size, suffix in info]
             raw_tasks.sort(key=lambda x: x.size)
             return raw_tasks
 
         # --- HEAVY WORKLOAD AI LOGIC ---
         # Only use the predictive model for non-trivial workloads
-        pq = []
-        for p in files:
-            size = p.stat().st_size
-            suffix = p.suffix.lower()
-            prio = self.cm.predict_seconds(chunk_size=size, suffix=suffix, sample=None)
-            heapq.heappush(pq, Task(prio, p, size, suffix))
-        
-        plan = []
-        while pq:
-            plan.append(heapq.heappop(pq))
-        return plan
-
-    def observe(self, p: Path, elapsed: float):
-        # Feedback loop for the AI model
-        size = p.stat().st_size
+        # One vectorized prediction for every file instead of a Python loop
+        prios = self.cm.predict_seconds_batch(sizes=[size for _, size, _ in info],
+                                              suffixes=[suffix for _, _, suffix in info])
+
+        # The whole heap is drained straight away, so one sort (Task.__lt__ on prio)
+        # does the same job as N heappush + N heappop.
+        tasks = [Task(prio, p, size, suffix) for (p, size, suffix), prio in zip(info, prios.tolist())]
+        tasks.sort()
+        return tasks
+
+    def observe(self, p: Path, elapsed: float, size: int = None):
+        # Feedback loop for the AI model (pass the planned size to skip a stat)
+        if size is None: size = p.stat().st_size
         self.cm.observe(chunk_size=size, suffix=p.suffix.lower(), actual_s=elapsed, sample=None)
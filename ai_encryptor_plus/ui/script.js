@@ -8,6 +8,8 @@ let chosenFilesEnc = [];
 let chosenFilesCmp = []; 
 // flag to ensure settings are fetched only once after first upload
 let settingsLoaded = false; // Flag to prevent spamming server
+// true while a re-check is scheduled (tuner still running on the server)
+let settingsPolling = false;
 
 // format bytes into human readable string
 function fmtBytes(n) {
@@ -41,7 +43,7 @@ function setStatus(text) {
 // fetch tuned settings from the server and reveal them in the UI
 async function revealSettings() {
     // If we already tuned the system, don't do it again.
-    if (settingsLoaded) return; // no-op if already loaded
+    if (settingsLoaded || settingsPolling) return; // no-op if already loaded / re-check pending
 
     setStatus("Analyzing hardware & workload..."); // indicate work
     try {
@@ -57,9 +59,18 @@ async function revealSettings() {
         $('auto-chunk-enc').textContent = c;
         $('auto-workers-cmp').textContent = w;
         $('auto-chunk-cmp').textContent = c;
+
+        // Auto-tuner runs in the background: show defaults now, re-check until it's done
+        if (settings.tuning) {
+            settingsPolling = true;
+            setStatus("Auto-tuning in background (default settings active)...");
+            setTimeout(() => { settingsPolling = false; revealSettings(); }, 2000);
+            return;
+        }
         
         settingsLoaded = true; // mark as done
-        setStatus("System optimized. Ready."); // update status
+        // tuned stays null if the tuner was skipped/failed
+        setStatus(settings.tuned ? "System optimized. Ready." : "Ready (Default Settings)"); // update status
     } catch (e) {
         console.error("Settings fetch error", e); // log error to console
         setStatus("Ready (Default Settings)"); // fallback status
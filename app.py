@@ -1,28 +1,35 @@
 import os
+import io
 import json
 import time
-import zipfile
 import tempfile
 import shutil
 import uuid
 import threading
+import multiprocessing
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
 from flask import (
     Flask, request, send_from_directory, jsonify, 
-    send_file, make_response, after_this_request
+    send_file, abort
 )
 from flask_cors import CORS
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 
 # Import your logic
-from ai_encryptor_plus.cli_plus import run_encrypt, run_decrypt
+from ai_encryptor_plus.cli_plus import run_encrypt, run_decrypt, walk
 from ai_encryptor_plus.autotuner import tune_short
-from ai_encryptor_plus.config import DEFAULT_CHUNK_MB
+from ai_encryptor_plus.config import DEFAULT_CHUNK_MB, MAX_UPLOAD_BYTES, DISK_HEADROOM
 from ai_encryptor_plus.scheduler_plus import SchedulerPlus
+from ai_encryptor_plus.packager import extract_archive
 
 app = Flask(__name__, static_folder='ai_encryptor_plus/ui')
 CORS(app)
+# Werkzeug refuses bigger bodies before parsing them
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 
 # --- GLOBAL SYSTEM STATE (Lazy Loaded) ---
 # We initialize these as None. They are spun up only on the first request.
@@ -31,44 +38,333 @@ GLOBAL_SCHEDULER = None
 _SYSTEM_LOCK = threading.Lock() # Lock to prevent race condition during tuning
 
 # Defaults (will be updated by tuner)
-BEST_WORKERS = 4
+# Hard ceiling: past ~16 AES workers, big boxes lose throughput to contention
+MAX_WORKERS = 16
+BEST_WORKERS = min(4, MAX_WORKERS)
 BEST_CHUNK_SIZE = DEFAULT_CHUNK_MB * 1024 * 1024
 
-# Cache
-DECRYPTED_SESSIONS = {}
+# --- HELPER: TEMP CLEANUP ---
+# Unlinks are pure syscalls (GIL released) - a few threads overlap them nicely
+_RM_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rmtree")
+
+def _fast_rmtree(path):
+    """
+    shutil.rmtree(ignore_errors=True) replacement: os.scandir walk (DirEntry
+    types are cached, no stat per entry), files unlinked in parallel, then
+    directories removed deepest-first.
+    """
+    files, dirs = [], []
+    stack = [str(path)]
+    while stack:
+        d = stack.pop()
+        dirs.append(d)
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False): stack.append(e.path)
+                    else: files.append(e.path)
+        except OSError: pass
+
+    def _unlink(p):
+        try: os.unlink(p)
+        except OSError: pass
+
+    wait([_RM_POOL.submit(_unlink, p) for p in files])
+    for d in reversed(dirs):
+        try: os.rmdir(d)
+        except OSError: pass
+
+# --- DECRYPTED SESSION CACHE (LRU + TTL) ---
+class SessionCache:
+    """
+    Bounded LRU of decrypt sessions. Entries older than ttl seconds, or pushed
+    out by maxsize, have their temp dir deleted. A Timer sweeps every 60s.
+    """
+    def __init__(self, maxsize: int=256, ttl: int=1800, sweep_every: int=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def put(self, sid: str, sess: dict):
+        with self._lock:
+            self._data[sid] = sess
+            self._data.move_to_end(sid)
+            evicted = []
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[1])
+            if self._timer is None: self._schedule()
+        # Disk cleanup outside the lock
+        for e in evicted: self._evict(e)
+
+    def get(self, sid: str):
+        with self._lock:
+            sess = self._data.get(sid)
+            if sess is None: return None
+            if time.time() - sess["time"] > self.ttl:
+                del self._data[sid]
+            else:
+                self._data.move_to_end(sid) # LRU touch
+                return sess
+        self._evict(sess)
+        return None
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, v in self._data.items() if now - v["time"] > self.ttl]
+            evicted = [self._data.pop(k) for k in expired]
+        for e in evicted: self._evict(e)
+
+    def _schedule(self):
+        self._timer = threading.Timer(self.sweep_every, self._tick)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _tick(self):
+        try: self.sweep()
+        except Exception as e: print(f"Error session sweep: {e}")
+        with self._lock: self._schedule()
+
+    @staticmethod
+    def _evict(sess: dict):
+        try: _fast_rmtree(sess.get("root", sess["path"]))
+        except: pass
+
+DECRYPTED_SESSIONS = SessionCache()
+
+# --- HELPER: POOL FACTORY ---
+def _make_pool(workers: int):
+    # 'spawn': Flask serves requests on threads, and fork() of a threaded
+    # process can clone held locks. Same behaviour on Linux and Windows.
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    # Pre-warm: pay the interpreter start-up for every worker now, not on the first upload
+    try:
+        for f in [pool.submit(os.getpid) for _ in range(workers)]: f.result()
+    except Exception as e:
+        print(f"--- Pool warm-up failed ({e}) ---")
+    return pool
+
+# --- POOL LEASES ---
+# Requests hold a lease on the pool they submit to. When the tuner swaps in a
+# new pool, the old one is shut down right away if nobody holds it, otherwise
+# by the last request that releases it - in-flight work never hits a dead pool.
+_POOL_LEASES = {} # pool -> active leases
+_RETIRED_POOLS = set()
+
+@contextmanager
+def _pool_lease():
+    with _SYSTEM_LOCK:
+        pool = GLOBAL_POOL
+        if pool is not None: _POOL_LEASES[pool] = _POOL_LEASES.get(pool, 0) + 1
+    try:
+        yield pool
+    finally:
+        if pool is not None:
+            with _SYSTEM_LOCK:
+                n = _POOL_LEASES.pop(pool) - 1
+                if n: _POOL_LEASES[pool] = n
+                last = not n and pool in _RETIRED_POOLS
+                if last: _RETIRED_POOLS.discard(pool)
+            if last: pool.shutdown(wait=False)
+
+# --- BACKGROUND AUTO-TUNER ---
+# Requests are served with the defaults above while this runs; the tuned
+# values are published under _SYSTEM_LOCK, and a pool of the tuned size is
+# built outside it and swapped in.
+TUNED_SETTINGS = None # None = tuner still running (or skipped)
+_POOL_WORKERS = 0
+_TUNER_THREAD = None
+_TUNER_LOCK = threading.Lock()
+
+def _run_tuner():
+    global GLOBAL_POOL, BEST_WORKERS, BEST_CHUNK_SIZE, TUNED_SETTINGS, _POOL_WORKERS
+    print("--- 🐢 Auto-Tuner running in background (serving defaults) ---")
+    try:
+        res = tune_short(max_workers=MAX_WORKERS)
+        workers = min(res.get('best_workers', os.cpu_count() or 4), MAX_WORKERS)
+        chunk = res.get('best_chunk', DEFAULT_CHUNK_MB * 1024 * 1024)
+    except Exception as e:
+        print(f"--- Tuner skipped ({e}), using defaults ---")
+        return
+
+    with _SYSTEM_LOCK:
+        BEST_WORKERS, BEST_CHUNK_SIZE = workers, chunk
+        TUNED_SETTINGS = {"workers": workers, "chunk_mb": chunk // 1024 // 1024}
+        if GLOBAL_SCHEDULER is not None:
+            GLOBAL_SCHEDULER.max_workers = workers
+        # No pool yet -> ensure_system_ready() builds it with the tuned size
+        resize = GLOBAL_POOL is not None and _POOL_WORKERS != workers
+
+    if resize:
+        # Spawn + warm-up takes a while: requests keep using the old pool meanwhile
+        new = _make_pool(workers)
+        with _SYSTEM_LOCK:
+            old, GLOBAL_POOL, _POOL_WORKERS = GLOBAL_POOL, new, workers
+            if old in _POOL_LEASES:
+                _RETIRED_POOLS.add(old) # last lease holder shuts it down
+                old = None
+        if old is not None: old.shutdown(wait=False)
+    print(f"--- System Optimized: {workers} Workers | {chunk//1024//1024}MB Chunks ---")
+
+def start_tuner():
+    """Starts the background tuner once per process."""
+    global _TUNER_THREAD
+    with _TUNER_LOCK:
+        if _TUNER_THREAD is not None: return
+        _TUNER_THREAD = threading.Thread(target=_run_tuner, name="autotuner", daemon=True)
+        _TUNER_THREAD.start()
 
 # --- HELPER: LAZY INITIALIZATION ---
 def ensure_system_ready():
     """
-    Runs the auto-tuner and starts the process pool ONLY when needed.
-    Uses a Lock to prevent concurrent tuning (solving the double-run issue).
+    Starts the process pool (with the current settings) ONLY when needed and
+    kicks off the background tuner. Lock prevents a double start.
     """
-    global GLOBAL_POOL, GLOBAL_SCHEDULER, BEST_WORKERS, BEST_CHUNK_SIZE
+    global GLOBAL_POOL, GLOBAL_SCHEDULER, _POOL_WORKERS
     
     # 1. Fast Check (If initialized, exit quickly)
     if GLOBAL_POOL is not None:
         return
 
+    # Never blocks on tuning - it runs beside the first requests
+    start_tuner()
+
     # 2. Lock Critical Section (Only one thread can pass here)
     with _SYSTEM_LOCK:
         # 3. Double Check (Safety) - In case another thread finished while we waited
         if GLOBAL_POOL is not None:
             return
 
-        print("--- 🐢 Lazy Loading: Waking up AI & Auto-Tuner... ---")
-        try:
-            # Run the benchmark now (first time)
-            res = tune_short()
-            BEST_WORKERS = res.get('best_workers', os.cpu_count() or 4)
-            BEST_CHUNK_SIZE = res.get('best_chunk', DEFAULT_CHUNK_MB * 1024 * 1024)
-            print(f"--- System Optimized: {BEST_WORKERS} Workers | {BEST_CHUNK_SIZE//1024//1024}MB Chunks ---")
-        except Exception as e:
-            print(f"--- Tuner skipped ({e}), using defaults ---")
-
+        print("--- 🐢 Lazy Loading: Starting worker pool... ---")
         # Initialize the persistent OS resources
-        GLOBAL_POOL = ProcessPoolExecutor(max_workers=BEST_WORKERS)
+        GLOBAL_POOL = _make_pool(BEST_WORKERS)
+        _POOL_WORKERS = BEST_WORKERS
         GLOBAL_SCHEDULER = SchedulerPlus(max_workers=BEST_WORKERS)
 
+# --- HELPER: TEMP DIR PLACEMENT ---
+SHM_DIR = "/dev/shm"
+SHM_MIN_FREE = 2 * 1024 ** 3 # Always leave this much tmpfs (= RAM) untouched
+
+def _temp_root():
+    """
+    tmpfs (/dev/shm) if it can hold this request and still keep SHM_MIN_FREE,
+    so intermediate files never touch the block layer. None = OS temp dir.
+    Only for encrypt/compare: their dir is deleted as soon as the response is
+    sent. Decrypt sessions live for up to 30 min and stay on disk.
+    """
+    if not os.path.isdir(SHM_DIR): return None
+    need = (request.content_length or 0) * DISK_HEADROOM
+    try:
+        if shutil.disk_usage(SHM_DIR).free > SHM_MIN_FREE + need: return SHM_DIR
+    except OSError: pass
+    return None
+
+def _new_temp_dir(root=None) -> Path:
+    return Path(tempfile.mkdtemp(dir=root))
+
+# --- HELPER: UPLOAD GUARD ---
+def _check_upload_space(root=None):
+    """
+    Rejects a request from its Content-Length before a single byte hits disk.
+    root = where the request's temp dir will go (None = OS temp dir).
+    Returns an error response, or None if the upload can go ahead.
+    """
+    size = request.content_length
+    if size is None: return None
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({"error": "Upload too large"}), 413
+    # Werkzeug spools every upload > 500KB into the OS temp dir first, and
+    # input + encrypted output + archive live in the temp dir at once
+    if root is None:
+        need = size * DISK_HEADROOM
+    else:
+        need = size # only the spool; tmpfs room was checked by _temp_root()
+    if shutil.disk_usage(tempfile.gettempdir()).free < need:
+        return jsonify({"error": "Not enough disk space"}), 507
+    return None
+
+# --- HELPER: FILENAME SANITIZING ---
+@functools.lru_cache(maxsize=4096)
+def _safe_name(name: str) -> str:
+    # secure_filename = several regex/normalize passes; same names recur across uploads
+    return secure_filename(name)
+
+# --- HELPER: UPLOAD -> DISK ---
+UPLOAD_COPY_BUF = 4 * 1024 * 1024 # FileStorage.save() copies in 16KB steps - too many syscalls
+
+def _save_upload(fs, dest: Path):
+    """
+    Saves an uploaded file. If Werkzeug already spooled it to a real temp file,
+    the kernel copies it with os.sendfile (no userspace buffer). Small in-memory
+    uploads fall back to a 4MB copyfileobj.
+    """
+    src = fs.stream # Werkzeug: TemporaryFile (big part) or BytesIO (small part)
+    in_fd = None
+    if hasattr(os, "sendfile"):
+        try: in_fd = src.fileno()
+        except (OSError, io.UnsupportedOperation): in_fd = None
+
+    with open(dest, "wb") as out:
+        if in_fd is not None:
+            start = offset = src.tell()
+            try:
+                while True:
+                    sent = os.sendfile(out.fileno(), in_fd, offset, UPLOAD_COPY_BUF)
+                    if sent == 0: return
+                    offset += sent
+            except OSError:
+                # e.g. sendfile file->file not supported here; restart plain copy
+                out.seek(0)
+                out.truncate()
+                src.seek(start)
+        shutil.copyfileobj(fs.stream, out, UPLOAD_COPY_BUF)
+
+# --- HELPER: PAGE-CACHE PREFETCH ---
+def _prefetch(in_dir: Path):
+    # Compare encrypts the same inputs twice: ask the kernel to keep/read them
+    # into page cache so the second run doesn't go back to disk
+    if not hasattr(os, "posix_fadvise"): return
+    for p, size, _ in walk(in_dir):
+        try:
+            fd = os.open(p, os.O_RDONLY)
+            try: os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally: os.close(fd)
+        except OSError: pass
+
+# --- HELPER: PAGE-CACHE DROP ---
+def _drop_page_cache(path: Path):
+    # Sent once, unlikely to be read again soon: let the kernel evict it now
+    # instead of pushing out hotter pages (next request's plaintext)
+    if not hasattr(os, "posix_fadvise"): return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try: os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally: os.close(fd)
+    except OSError: pass
+
+# --- HELPER: STREAMED DOWNLOAD + CLEANUP ---
+def _send_and_cleanup(path: Path, temp_dir: Path):
+    """
+    Streams the file straight from disk (wsgi.file_wrapper / sendfile, no read()
+    into RAM). conditional/etag are off: these are POST responses, which never
+    get Range or 304 handling, so Flask's defaults would only add a useless ETag.
+    Temp dir is removed only after the body is fully sent (call_on_close), so
+    Windows never sees a delete on an open file (WinError 32).
+    """
+    # max_age=0: one-off archive, browsers/proxies must not cache it
+    response = send_file(path, as_attachment=True, download_name=Path(path).name,
+                         conditional=False, etag=False, max_age=0)
+
+    def cleanup():
+        try: _fast_rmtree(temp_dir)
+        except: pass
+
+    response.call_on_close(cleanup)
+    return response
+
 # --- ROUTES ---
 
 @app.route('/')
@@ -86,19 +382,31 @@ def get_settings():
     
     return jsonify({
         "workers": BEST_WORKERS,
-        "chunk_mb": BEST_CHUNK_SIZE // 1024 // 1024
+        "max_workers": MAX_WORKERS,
+        "chunk_mb": BEST_CHUNK_SIZE // 1024 // 1024,
+        # null until the background tuner finishes
+        "tuned": TUNED_SETTINGS,
+        # UI keeps polling while this is true
+        "tuning": _TUNER_THREAD is not None and _TUNER_THREAD.is_alive()
     })
 
 @app.route('/api/encrypt', methods=['POST'])
 def handle_encrypt():
     ensure_system_ready() # Ensure pool exists before processing
     
-    temp_dir = Path(tempfile.mkdtemp())
+    # Picked once: guard and mkdtemp must agree on the location
+    root = _temp_root()
+    err = _check_upload_space(root)
+    if err: return err
+
+    temp_dir = _new_temp_dir(root)
     try:
         files = request.files.getlist('files')
         password = request.form.get('password')
         mode = request.form.get('mode', 'gcm')
         policy = request.form.get('policy', 'priority') 
+        # Opt-in DEFLATE; default STORED (encrypted bytes don't compress)
+        compress = request.form.get('compress', '').lower() in ('1', 'true', 'yes')
         
         if not files or not password:
             return jsonify({"error": "Missing files/password"}), 400
@@ -107,37 +415,32 @@ def handle_encrypt():
 
         in_dir = temp_dir / "in"
         out_dir = temp_dir / "out"
-        in_dir.mkdir(parents=True, exist_ok=True)
-        out_dir.mkdir(parents=True, exist_ok=True)
+        os.mkdir(in_dir) # temp_dir is brand new: one syscall, no parents/exists checks
+        os.mkdir(out_dir)
         
+        in_dir_s = str(in_dir)
         for f in files:
-            f.save(in_dir / secure_filename(f.filename))
+            _save_upload(f, os.path.join(in_dir_s, _safe_name(f.filename)))
             
         print(f"--- Processing ({policy}) ---")
         
-        time_elapsed, zip_path_str = run_encrypt(
-            in_dir=str(in_dir), out_dir=str(out_dir),
-            mode=mode, master_secret=password,
-            workers=BEST_WORKERS, policy=policy, 
-            use_processes=True, chunk_size=threshold_chunk,
-            scheduler=GLOBAL_SCHEDULER, executor=GLOBAL_POOL
-        )
+        with _pool_lease() as pool:
+            time_elapsed, zip_path_str = run_encrypt(
+                in_dir=str(in_dir), out_dir=str(out_dir),
+                mode=mode, master_secret=password,
+                workers=BEST_WORKERS, policy=policy, 
+                use_processes=True, chunk_size=threshold_chunk,
+                scheduler=GLOBAL_SCHEDULER, executor=pool,
+                compress=compress
+            )
         
-        zip_path = Path(zip_path_str)
-
-        @after_this_request
-        def cleanup(response):
-            try: shutil.rmtree(temp_dir, ignore_errors=True)
-            except: pass
-            return response
-
-        response = make_response(send_file(zip_path, as_attachment=True, download_name=zip_path.name))
+        response = _send_and_cleanup(Path(zip_path_str), temp_dir)
         response.headers['X-Time-Elapsed'] = f"{time_elapsed:.4f}"
         return response
 
     except Exception as e:
         print(f"Error: {e}")
-        if temp_dir.exists(): shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir.exists(): _fast_rmtree(temp_dir)
         return jsonify({"error": str(e)}), 500
 
 
@@ -145,103 +448,120 @@ def handle_encrypt():
 def handle_compare():
     ensure_system_ready()
     
-    temp_dir = Path(tempfile.mkdtemp())
+    # Picked once: guard and mkdtemp must agree on the location
+    root = _temp_root()
+    err = _check_upload_space(root)
+    if err: return err
+
+    temp_dir = _new_temp_dir(root)
     try:
         files = request.files.getlist('files')
         password = request.form.get('password')
         mode = request.form.get('mode', 'gcm')
         
         in_dir = temp_dir / "in"
-        in_dir.mkdir(parents=True, exist_ok=True)
-        for f in files: f.save(in_dir / secure_filename(f.filename))
+        os.mkdir(in_dir)
+        in_dir_s = str(in_dir)
+        for f in files: _save_upload(f, os.path.join(in_dir_s, _safe_name(f.filename)))
             
         threshold_chunk = int(BEST_CHUNK_SIZE)
-
-        print("--- Compare: FIFO ---")
-        out_fifo = temp_dir / "out_fifo"
-        t_fifo, _ = run_encrypt(
-            str(in_dir), str(out_fifo), mode, password, BEST_WORKERS, 
-            policy='fifo', use_processes=True, chunk_size=threshold_chunk,
-            executor=GLOBAL_POOL
-        )
-
-        print("--- Compare: AI ---")
-        out_ai = temp_dir / "out_ai"
-        t_ai, z_ai = run_encrypt(
-            str(in_dir), str(out_ai), mode, password, BEST_WORKERS, 
-            policy='priority', use_processes=True, chunk_size=threshold_chunk,
-            scheduler=GLOBAL_SCHEDULER, executor=GLOBAL_POOL
-        )
-        
-        @after_this_request
-        def cleanup(response):
-            try: shutil.rmtree(temp_dir, ignore_errors=True)
-            except: pass
-            return response
-            
-        response = make_response(send_file(Path(z_ai), as_attachment=True, download_name=Path(z_ai).name))
+        _prefetch(in_dir)
+
+        # One lease for both runs: FIFO and AI must race on the same pool
+        with _pool_lease() as pool:
+            print("--- Compare: FIFO ---")
+            out_fifo = temp_dir / "out_fifo"
+            t_fifo, _ = run_encrypt(
+                str(in_dir), str(out_fifo), mode, password, BEST_WORKERS, 
+                policy='fifo', use_processes=True, chunk_size=threshold_chunk,
+                executor=pool, archive=False
+            )
+
+            print("--- Compare: AI ---")
+            out_ai = temp_dir / "out_ai"
+            t_ai, z_ai = run_encrypt(
+                str(in_dir), str(out_ai), mode, password, BEST_WORKERS, 
+                policy='priority', use_processes=True, chunk_size=threshold_chunk,
+                scheduler=GLOBAL_SCHEDULER, executor=pool
+            )
+
+        response = _send_and_cleanup(Path(z_ai), temp_dir)
         response.headers['X-Time-FIFO'] = f"{t_fifo:.4f}"
         response.headers['X-Time-AI'] = f"{t_ai:.4f}"
         return response
 
     except Exception as e:
-        if temp_dir.exists(): shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir.exists(): _fast_rmtree(temp_dir)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/decrypt', methods=['POST'])
 def handle_decrypt():
     ensure_system_ready()
     
-    temp_dir = Path(tempfile.mkdtemp())
+    # Session dir outlives the request - keep it on disk, not in RAM
+    err = _check_upload_space()
+    if err: return err
+
+    temp_dir = _new_temp_dir()
     try:
         file = request.files.get('file')
         password = request.form.get('password')
 
         in_dir = temp_dir / "in"
         out_dir = temp_dir / "out"
-        in_dir.mkdir(parents=True, exist_ok=True)
-        out_dir.mkdir(parents=True, exist_ok=True)
+        os.mkdir(in_dir)
+        os.mkdir(out_dir)
         
-        zip_path = temp_dir / secure_filename(file.filename)
-        file.save(zip_path)
-
-        # Secure Extract
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            for m in z.infolist():
-                if m.is_dir(): continue
-                target = (in_dir / m.filename).resolve()
-                if str(target).startswith(str(in_dir.resolve())):
-                    z.extract(m, in_dir)
-
-        run_decrypt(
-            str(in_dir), str(out_dir), password, BEST_WORKERS,
-            use_processes=True, executor=GLOBAL_POOL
-        )
-
-        files = [str(Path(r).relative_to(out_dir)/f) for r,d,fs in os.walk(out_dir) for f in fs]
+        zip_path = temp_dir / _safe_name(file.filename)
+        _save_upload(file, zip_path)
+
+        with _pool_lease() as pool:
+            # Secure Extract (streamed, 4MB copies, members spread over the pool)
+            extract_archive(zip_path, in_dir, executor=pool, workers=BEST_WORKERS)
+
+            run_decrypt(
+                str(in_dir), str(out_dir), password, BEST_WORKERS,
+                use_processes=True, executor=pool
+            )
+
+        files = [p.relative_to(out_dir).as_posix() for p, _, _ in walk(out_dir)]
         sid = str(uuid.uuid4())
-        DECRYPTED_SESSIONS[sid] = { "path": out_dir, "time": time.time() }
+        DECRYPTED_SESSIONS.put(sid, { "path": out_dir, "root": temp_dir, "time": time.time() })
         
         return jsonify({ "session_id": sid, "files": files })
 
     except Exception as e:
-        if temp_dir.exists(): shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir.exists(): _fast_rmtree(temp_dir)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/download_decrypted/<session_id>/<path:filename>')
 def download_decrypted_file(session_id, filename):
     sess = DECRYPTED_SESSIONS.get(session_id)
     if not sess: return "Expired", 404
-    safe_p = (Path(sess["path"]) / filename.replace("..", "")).resolve()
+    base = Path(sess["path"]).resolve()
+    safe_p = (base / filename).resolve()
+    # Must stay inside the session folder ("..", absolute names, symlinks out)
+    if os.path.commonpath([str(base), str(safe_p)]) != str(base): abort(403)
     if not safe_p.is_file(): return "Not found", 404
-    return send_file(safe_p, as_attachment=True, download_name=safe_p.name)
+    # Range/If-None-Match support: interrupted downloads resume (206) instead of restarting
+    response = send_file(safe_p, as_attachment=True, download_name=safe_p.name,
+                         conditional=True, etag=True, last_modified=safe_p.stat().st_mtime)
+    # File stays on disk for the session; its pages don't need to stay in RAM
+    response.call_on_close(lambda: _drop_page_cache(safe_p))
+    return response
 
 if __name__ == '__main__':
+    # Tune in the background right away - but only in the serving child, not
+    # in the reloader's watcher process (which never handles requests)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_tuner()
     # We add exclude_patterns to stop the server from restarting 
     # when we write to keyvault.db or output folders, solving the previous stability issues.
     app.run(
         debug=True, 
         port=5000, 
+        # One thread per request: a download drains while the next upload encrypts
+        threaded=True,
         exclude_patterns=[
             "keyvault.db", 
             "*.db", 
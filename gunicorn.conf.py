@@ -0,0 +1,28 @@
+# gunicorn.conf.py - production server config
+# Run: gunicorn -c gunicorn.conf.py app:app
+import os
+
+# Loopback by default: this server takes passwords, owns the key vault and
+# allows CORS from any origin. Expose it on purpose, e.g. AI_ENC_BIND=0.0.0.0:5000
+bind = os.environ.get("AI_ENC_BIND", "127.0.0.1:5000")
+
+# --- PROCESS MODEL ---
+# ONE gunicorn worker: the app already owns a process pool for AES work, and
+# decrypt sessions / key cache live in that process's memory. More gunicorn
+# workers would each start their own pool and not see each other's sessions.
+# Concurrency comes from threads (gthread) instead.
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get("AI_ENC_THREADS", "8"))
+
+# Big uploads + encryption can take minutes - don't kill the worker mid-request
+timeout = int(os.environ.get("AI_ENC_TIMEOUT", "600"))
+graceful_timeout = 30
+
+# Downloads go out through sendfile(2) (wsgi.file_wrapper), no userspace copy
+sendfile = True
+
+def post_worker_init(worker):
+    # Start benchmarking as soon as the worker is up, not on the first request
+    import app as web
+    web.start_tuner()
@@ -0,0 +1,8 @@
+# tests/conftest.py
+import os, sys, tempfile
+
+# Throwaway key vault - must be set before ai_encryptor_plus.config is imported
+os.environ.setdefault("AI_ENC_VAULT", os.path.join(tempfile.mkdtemp(prefix="ai_enc_vault_"), "keyvault.db"))
+
+# Repo root on sys.path: app.py lives there, next to the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
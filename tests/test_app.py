@@ -0,0 +1,73 @@
+# tests/test_app.py
+import os, time
+import pytest
+
+import app as web
+from app import SessionCache
+
+@pytest.fixture
+def client():
+    return web.app.test_client()
+
+@pytest.fixture
+def session(tmp_path):
+    # Decrypt session as /api/decrypt leaves it: <root>/out/<files>
+    out = tmp_path / "root" / "out"
+    out.mkdir(parents=True)
+    (out / "a.txt").write_bytes(b"hello")
+    (tmp_path / "secret.txt").write_bytes(b"outside")
+    os.symlink(tmp_path / "secret.txt", out / "link.txt")
+    sid = f"test-{tmp_path.name}"
+    web.DECRYPTED_SESSIONS.put(sid, {"path": out, "root": out.parent, "time": time.time()})
+    return sid
+
+# --- DOWNLOAD ROUTE ---
+def test_download_ok(client, session):
+    r = client.get(f"/api/download_decrypted/{session}/a.txt")
+    assert r.status_code == 200 and r.data == b"hello"
+
+@pytest.mark.parametrize("name", ["../../secret.txt", "..%2F..%2Fsecret.txt", "link.txt"])
+def test_download_outside_session_forbidden(client, session, name):
+    r = client.get(f"/api/download_decrypted/{session}/{name}")
+    assert r.status_code == 403
+
+def test_download_unknown_session(client):
+    assert client.get("/api/download_decrypted/nope/a.txt").status_code == 404
+
+# --- SESSION CACHE ---
+def _sess(tmp_path, name, t=None):
+    d = tmp_path / name
+    d.mkdir()
+    (d / "f").write_bytes(b"x")
+    return d, {"path": d, "time": time.time() if t is None else t}
+
+def test_session_ttl_expiry_removes_dir(tmp_path):
+    cache = SessionCache(ttl=60)
+    d, s = _sess(tmp_path, "old", t=time.time() - 120)
+    cache.put("old", s)
+    assert cache.get("old") is None
+    assert not d.exists()
+
+def test_session_sweep(tmp_path):
+    cache = SessionCache(ttl=60)
+    d_old, s_old = _sess(tmp_path, "old", t=time.time() - 120)
+    d_new, s_new = _sess(tmp_path, "new")
+    cache.put("old", s_old)
+    cache.put("new", s_new)
+    cache.sweep()
+    assert not d_old.exists() and d_new.exists()
+    assert cache.get("new") is s_new
+
+def test_session_lru_eviction(tmp_path):
+    cache = SessionCache(maxsize=2)
+    dirs = {}
+    for k in ("a", "b"):
+        dirs[k], s = _sess(tmp_path, k)
+        cache.put(k, s)
+    # Touch "a" -> "b" is now least recently used
+    assert cache.get("a") is not None
+    dirs["c"], s = _sess(tmp_path, "c")
+    cache.put("c", s)
+    assert cache.get("b") is None and not dirs["b"].exists()
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert dirs["a"].exists() and dirs["c"].exists()
@@ -0,0 +1,129 @@
+# tests/test_chunked_ctr.py
+import os, json
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from ai_encryptor_plus.chunked_ctr import (
+    encrypt_file_chunked, decrypt_file_chunked,
+    MACS_MAGIC, MACS_HEADER_SIZE, MAC_SIZE, OFFSET_ENTRY_SIZE,
+)
+from ai_encryptor_plus.encryptor import gen_key
+
+PW = "test-pw"
+CHUNK = 64 * 1024
+SIZE = 5 * CHUNK + 123 # last chunk shorter than the rest
+
+@pytest.fixture(scope="module")
+def pool():
+    # Threads: same code path as the app pool, without spawn start-up per test
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        yield ex
+
+@pytest.fixture
+def encrypted(tmp_path, pool):
+    data = os.urandom(SIZE)
+    src = tmp_path / "plain.bin"
+    src.write_bytes(data)
+    enc = tmp_path / "plain.bin.enc"
+    encrypt_file_chunked(src, enc, gen_key(), f"test-{tmp_path.name}", PW,
+                         chunk_size=CHUNK, workers=4, executor=pool)
+    return data, enc
+
+def _decrypt(enc, out, pool):
+    decrypt_file_chunked(enc, out, master_secret=PW, workers=4, executor=pool)
+    return out.read_bytes()
+
+def _sidecar(enc):
+    return enc.with_suffix(enc.suffix + ".meta.bin")
+
+def _manifest(enc):
+    return enc.with_suffix(enc.suffix + ".meta.json")
+
+# --- ROUND TRIP ---
+def test_roundtrip(encrypted, tmp_path, pool):
+    data, enc = encrypted
+    assert enc.read_bytes() != data
+    assert _decrypt(enc, tmp_path / "out.bin", pool) == data
+
+def test_roundtrip_empty_file(tmp_path, pool):
+    src = tmp_path / "empty.bin"
+    src.write_bytes(b"")
+    enc = tmp_path / "empty.bin.enc"
+    encrypt_file_chunked(src, enc, gen_key(), "test-empty", PW, chunk_size=CHUNK, executor=pool)
+    assert _decrypt(enc, tmp_path / "out.bin", pool) == b""
+
+# --- MANIFEST VERSIONS ---
+def test_v3_sidecar_layout(encrypted):
+    _, enc = encrypted
+    m = json.loads(_manifest(enc).read_text())
+    assert m["version"] == 3 and "chunk_hmacs" not in m
+    blob = _sidecar(enc).read_bytes()
+    n = m["chunk_count"]
+    assert n == 6
+    assert blob[:5] == MACS_MAGIC
+    assert int.from_bytes(blob[5:13], "big") == CHUNK
+    assert int.from_bytes(blob[13:21], "big") == n
+    assert len(blob) == MACS_HEADER_SIZE + n * (MAC_SIZE + OFFSET_ENTRY_SIZE)
+
+def test_v2_sidecar_without_offsets(encrypted, tmp_path, pool):
+    data, enc = encrypted
+    n = json.loads(_manifest(enc).read_text())["chunk_count"]
+    # v2 = MACs only, offsets come from scanning the length prefixes
+    side = _sidecar(enc)
+    side.write_bytes(side.read_bytes()[:MACS_HEADER_SIZE + n * MAC_SIZE])
+    assert _decrypt(enc, tmp_path / "out.bin", pool) == data
+
+def test_v1_hex_macs_in_json(encrypted, tmp_path, pool):
+    data, enc = encrypted
+    m = json.loads(_manifest(enc).read_text())
+    blob = _sidecar(enc).read_bytes()
+    macs = blob[MACS_HEADER_SIZE:MACS_HEADER_SIZE + m["chunk_count"] * MAC_SIZE]
+    m["chunk_hmacs"] = [macs[i:i + MAC_SIZE].hex() for i in range(0, len(macs), MAC_SIZE)]
+    m["version"] = 1
+    _manifest(enc).write_text(json.dumps(m))
+    _sidecar(enc).unlink()
+    assert _decrypt(enc, tmp_path / "out.bin", pool) == data
+
+# --- TAMPER / TRUNCATION ---
+def test_tampered_chunk_rejected(encrypted, tmp_path, pool):
+    _, enc = encrypted
+    b = bytearray(enc.read_bytes())
+    b[-10] ^= 1
+    enc.write_bytes(bytes(b))
+    out = tmp_path / "out.bin"
+    with pytest.raises(ValueError, match="HMAC mismatch"):
+        _decrypt(enc, out, pool)
+    # No partial plaintext left behind
+    assert not out.exists()
+    assert not out.with_suffix(out.suffix + ".tmp").exists()
+
+def test_tampered_sidecar_rejected(encrypted, tmp_path, pool):
+    _, enc = encrypted
+    b = bytearray(_sidecar(enc).read_bytes())
+    b[MACS_HEADER_SIZE] ^= 1
+    _sidecar(enc).write_bytes(bytes(b))
+    with pytest.raises(ValueError, match="HMAC mismatch"):
+        _decrypt(enc, tmp_path / "out.bin", pool)
+
+@pytest.mark.parametrize("v2", [False, True])
+def test_truncated_file_rejected(encrypted, tmp_path, pool, v2):
+    _, enc = encrypted
+    if v2:
+        n = json.loads(_manifest(enc).read_text())["chunk_count"]
+        side = _sidecar(enc)
+        side.write_bytes(side.read_bytes()[:MACS_HEADER_SIZE + n * MAC_SIZE])
+    enc.write_bytes(enc.read_bytes()[:-100])
+    with pytest.raises(ValueError, match="Truncated"):
+        _decrypt(enc, tmp_path / "out.bin", pool)
+
+def test_truncated_sidecar_rejected(encrypted, tmp_path, pool):
+    _, enc = encrypted
+    side = _sidecar(enc)
+    side.write_bytes(side.read_bytes()[:-5])
+    with pytest.raises(ValueError, match="Truncated"):
+        _decrypt(enc, tmp_path / "out.bin", pool)
+
+def test_wrong_password_rejected(encrypted, tmp_path, pool):
+    _, enc = encrypted
+    with pytest.raises(Exception):
+        decrypt_file_chunked(enc, tmp_path / "out.bin", master_secret="wrong", executor=pool)
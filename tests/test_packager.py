@@ -0,0 +1,29 @@
+# tests/test_packager.py
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from ai_encryptor_plus.packager import extract_archive
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_extract_skips_path_traversal(tmp_path, parallel):
+    zip_path = tmp_path / "evil.zip"
+    with zipfile.ZipFile(zip_path, "w") as z:
+        z.writestr("ok.enc", b"fine")
+        z.writestr("sub/ok2.enc", b"fine too")
+        z.writestr("../escape.txt", b"pwned")
+        z.writestr("sub/../../escape2.txt", b"pwned")
+        z.writestr(str(tmp_path / "abs.txt"), b"pwned")
+
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    if parallel:
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            out = extract_archive(zip_path, dest, executor=ex, workers=2)
+    else:
+        out = extract_archive(zip_path, dest)
+
+    assert sorted(p.relative_to(dest.resolve()).as_posix() for p in out) == ["ok.enc", "sub/ok2.enc"]
+    assert not (tmp_path / "escape.txt").exists()
+    assert not (tmp_path / "escape2.txt").exists()
+    assert not (tmp_path / "abs.txt").exists()
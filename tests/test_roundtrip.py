@@ -0,0 +1,27 @@
+# tests/test_roundtrip.py
+import os, zipfile
+import pytest
+
+from ai_encryptor_plus.cli_plus import run_encrypt, run_decrypt
+
+PW = "test-pw"
+
+@pytest.mark.parametrize("mode", ["gcm", "ctr", "cbc"])
+def test_encrypt_decrypt_roundtrip(tmp_path, mode):
+    src = tmp_path / "in"
+    src.mkdir()
+    files = {"empty.txt": b"", "a.txt": b"hello", "b.bin": os.urandom(300 * 1024 + 7)}
+    for name, data in files.items():
+        (src / name).write_bytes(data)
+
+    _, zip_path = run_encrypt(str(src), str(tmp_path / "out"), mode, PW, workers=2, use_processes=False)
+
+    ex = tmp_path / "ex"
+    with zipfile.ZipFile(zip_path) as z:
+        # Archive holds ciphertext only
+        assert not any(n.endswith(("a.txt", "b.bin")) for n in z.namelist())
+        z.extractall(ex)
+
+    run_decrypt(str(ex), str(tmp_path / "dec"), PW, workers=2, use_processes=False)
+    for name, data in files.items():
+        assert (tmp_path / "dec" / name).read_bytes() == data